@@ -3,10 +3,14 @@ from prompt_toolkit.shortcuts import (
 )
 
 from prompt import styles, sign_in, sign_up, manager_menu, student_menu
-from config import userRoles
+from config import databaseConfig, userRoles
+from search import memory
 
 
 if __name__=='__main__':
+    with databaseConfig.Session() as session:
+        memory.build(session)
+
     while True:
         signin_signup_selected = button_dialog(
             title='Sign In | Sign Up',
@@ -0,0 +1,76 @@
+import time
+import argparse
+from datetime import date, timedelta
+from sqlalchemy import select, insert, delete, exists
+
+from config import baseConfig, databaseConfig
+from models import Request, RequestHistory
+from logger import LOGGER
+
+
+ARCHIVED_COLUMNS = ['id', 'book_id', 'user_id', 'copy_id', 'delivery_date', 'return_deadline', 'return_date']
+
+
+def archive_batch(connection, cutoff: date, batch_size: int, after_id: int = 0) -> tuple:
+    """
+    Move up to `batch_size` requests returned before `cutoff`, with ids above `after_id`,
+    into requests_history within the caller's transaction. Only the requests the INSERT
+    actually copied are deleted; a request whose id is already in the history is left in
+    place with a warning, since it is a different loan that reused an archived id.
+    Returns the ids examined and the number of requests moved.
+    """
+    ids = connection.execute(
+        select(Request.id)
+        .where(Request.id > after_id, Request.return_date.is_not(None), Request.return_date < cutoff)
+        .order_by(Request.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return ids, 0
+
+    archived = exists().where(RequestHistory.id == Request.id)
+    copied = connection.execute(
+        insert(RequestHistory).from_select(
+            ARCHIVED_COLUMNS,
+            select(*(getattr(Request, column) for column in ARCHIVED_COLUMNS)).where(Request.id.in_(ids), ~archived),
+        ).returning(RequestHistory.id)
+    ).scalars().all()
+    if len(copied) < len(ids):
+        skipped = sorted(set(ids) - set(copied))
+        LOGGER.warning(f"Requests {skipped} share their id with archived requests and were not archived; run the migrations")
+    if copied:
+        connection.execute(delete(Request).where(Request.id.in_(copied)))
+    return ids, len(copied)
+
+
+def archive(engine, older_than_days: int = None, batch_size: int = None, today: date = None) -> int:
+    """
+    Move every request returned more than `older_than_days` ago out of the hot requests table,
+    one short transaction per batch so reservations keep going while the archiver runs.
+    Returns the number of requests moved.
+    """
+    older_than_days = baseConfig.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or baseConfig.ARCHIVE_BATCH_SIZE
+    cutoff = (today or date.today()) - timedelta(days=older_than_days)
+
+    moved, after_id = 0, 0
+    while True:
+        with engine.begin() as connection:
+            ids, copied = archive_batch(connection, cutoff, batch_size, after_id)
+        if not ids:
+            break
+        # Seek past the kept rows instead of scanning them again on every batch
+        moved, after_id = moved + copied, ids[-1]
+        LOGGER.info(f"Archived {moved} requests returned before {cutoff}")
+    return moved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move old closed requests into requests_history.')
+    parser.add_argument('--older-than', type=int, default=None, help=f'Archive requests returned more than this many days ago (default: {baseConfig.ARCHIVE_AFTER_DAYS}).')
+    parser.add_argument('--batch-size', type=int, default=None, help=f'Requests moved per transaction (default: {baseConfig.ARCHIVE_BATCH_SIZE}).')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    moved = archive(databaseConfig.engine, args.older_than, args.batch_size)
+    print(f"Archived {moved} requests in {time.perf_counter() - started:.2f}s")
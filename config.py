@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -13,13 +13,47 @@ class baseConfig:
     DATABASE_URL = os.getenv('DATABASE_URL')
     MAX_RESERVATIONS_LIMIT = int(os.getenv('MAX_RESERVATIONS_LIMIT'))
     PENALTY_RATE_PER_DAY = int(os.getenv('PENALTY_RATE_PER_DAY'))
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', 4))
+    REFERENCE_CACHE_SIZE = int(os.getenv('REFERENCE_CACHE_SIZE', 1024))
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 600))
+    PENALTY_CACHE_SIZE = int(os.getenv('PENALTY_CACHE_SIZE', 4096))
+    PENALTY_CACHE_TTL = int(os.getenv('PENALTY_CACHE_TTL', 3600))
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 5000))
+    HOLD_PICKUP_DAYS = int(os.getenv('HOLD_PICKUP_DAYS', 3))
+    REMINDER_DAYS_BEFORE = int(os.getenv('REMINDER_DAYS_BEFORE', 2))
+    SCHEDULER_BATCH_SIZE = int(os.getenv('SCHEDULER_BATCH_SIZE', 1000))
+    SCHEDULER_REFRESH_SECONDS = int(os.getenv('SCHEDULER_REFRESH_SECONDS', 300))
 
 
 class databaseConfig:
     declarativeBase = declarative_base()
     engine = create_engine(baseConfig.DATABASE_URL)
-    Session = sessionmaker(bind=engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+@event.listens_for(databaseConfig.engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; the busy timeout makes writers queue instead of failing
+    if databaseConfig.engine.dialect.name == 'sqlite':
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
 
 
 class userRoles:
     STUDENT, MANAGER = 'student', 'manager'
+
+
+class copyStatuses:
+    AVAILABLE, ON_LOAN, HELD = 'available', 'on_loan', 'held'
+
+
+class holdStatuses:
+    WAITING, READY, FULFILLED, CANCELLED, EXPIRED = 'waiting', 'ready', 'fulfilled', 'cancelled', 'expired'
+
+
+class notificationKinds:
+    DUE_SOON, OVERDUE = 'due_soon', 'overdue'
@@ -0,0 +1,149 @@
+import csv
+import time
+import argparse
+import resource
+from datetime import date
+from sqlalchemy import select, type_coerce, String
+
+from config import databaseConfig
+from models import User, Book, Copy, RequestRecord
+from logger import LOGGER
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+BATCH_SIZE = 50_000
+
+COLUMNS = [
+    ('request_id', RequestRecord.id),
+    ('user_id', RequestRecord.user_id),
+    ('email', User.email),
+    ('first_name', User.first_name),
+    ('last_name', User.last_name),
+    ('book_id', RequestRecord.book_id),
+    ('book_name', Book.book_name),
+    ('isbn', Book.isbn),
+    ('barcode', Copy.barcode),
+    # Dates are read as stored instead of being parsed into date objects and formatted back
+    ('delivery_date', type_coerce(RequestRecord.delivery_date, String)),
+    ('return_deadline', type_coerce(RequestRecord.return_deadline, String)),
+    ('return_date', type_coerce(RequestRecord.return_date, String)),
+]
+
+
+def parquet_schema():
+    return pyarrow.schema([
+        ('request_id', pyarrow.int64()),
+        ('user_id', pyarrow.int64()),
+        ('email', pyarrow.string()),
+        ('first_name', pyarrow.string()),
+        ('last_name', pyarrow.string()),
+        ('book_id', pyarrow.int64()),
+        ('book_name', pyarrow.string()),
+        ('isbn', pyarrow.string()),
+        ('barcode', pyarrow.string()),
+        ('delivery_date', pyarrow.date32()),
+        ('return_deadline', pyarrow.date32()),
+        ('return_date', pyarrow.date32()),
+    ])
+
+
+def history_statement(delivered_from: date = None, delivered_to: date = None, user_id: int = None):
+    """
+    Live and archived requests joined with their user, book and lent copy, in request order.
+    Requests whose book or copy is unknown are kept with empty columns.
+    """
+    statement = (
+        select(*(column.label(name) for name, column in COLUMNS))
+        .join(User, User.id == RequestRecord.user_id)
+        .outerjoin(Book, Book.id == RequestRecord.book_id)
+        .outerjoin(Copy, Copy.id == RequestRecord.copy_id)
+        .order_by(RequestRecord.id)
+    )
+    if delivered_from is not None:
+        statement = statement.where(RequestRecord.delivery_date >= delivered_from)
+    if delivered_to is not None:
+        statement = statement.where(RequestRecord.delivery_date <= delivered_to)
+    if user_id is not None:
+        statement = statement.where(RequestRecord.user_id == user_id)
+    return statement
+
+
+def stream_batches(connection, statement, batch_size: int = BATCH_SIZE):
+    """
+    Yield the rows of `statement` in lists of at most `batch_size`, read from a server-side cursor.
+    """
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+    yield from result.partitions()
+
+
+def write_csv(batches, output: str) -> int:
+    rows = 0
+    with open(output, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([name for name, _ in COLUMNS])
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def write_parquet(batches, output: str) -> int:
+    """
+    Write each batch as one Parquet row group, so only one batch is held in memory.
+    """
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow; install it with `pip install pyarrow`")
+    schema = parquet_schema()
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(output, schema) as writer:
+        for batch in batches:
+            columns = zip(*batch)
+            writer.write_batch(pyarrow.record_batch(
+                [pyarrow.array(values).cast(field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            rows += len(batch)
+    return rows
+
+
+WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def export(engine, output: str, format: str = 'csv', delivered_from: date = None, delivered_to: date = None, user_id: int = None, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Stream the circulation history into `output` and return the number of rows written.
+    """
+    with engine.connect() as connection:
+        batches = stream_batches(connection, history_statement(delivered_from, delivered_to, user_id), batch_size)
+        return WRITERS[format](batches, output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the circulation history joined with users and books.')
+    parser.add_argument('output', help='Path of the file to write.')
+    parser.add_argument('--format', choices=sorted(WRITERS), default=None, help='Output format (default: from the file extension).')
+    parser.add_argument('--from', dest='delivered_from', type=date.fromisoformat, default=None, help='Only requests delivered on or after this day.')
+    parser.add_argument('--to', dest='delivered_to', type=date.fromisoformat, default=None, help='Only requests delivered on or before this day.')
+    parser.add_argument('--user', type=int, default=None, help='Only requests of this user ID.')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    format = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    started = time.perf_counter()
+    try:
+        rows = export(databaseConfig.engine, args.output, format, args.delivered_from, args.delivered_to, args.user, args.batch_size)
+    except RuntimeError as e:
+        LOGGER.error(e)
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    LOGGER.info(f"Exported {rows} requests to {args.output} in {elapsed:.2f}s")
+    print(f"Exported {rows} requests in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s, peak RSS {peak} MiB)")
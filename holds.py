@@ -0,0 +1,273 @@
+import heapq
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, insert, func, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import baseConfig, copyStatuses, holdStatuses
+from models import Book, Copy, Request, Hold, add_copies, checkout_copies, session_scope
+from logger import LOGGER
+
+
+class HoldError(Exception):
+    AVAILABLE = 'available'
+    ALREADY_BORROWED = 'already_borrowed'
+    ALREADY_HOLDING = 'already_holding'
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class ExpiryHeap:
+    """
+    Min-heap of (expires_at, hold id) over the ready holds, so finding the holds whose pickup
+    window has passed never scans the holds table. The database stays authoritative: popped
+    entries are checked again when they are expired, so stale entries are harmless.
+
+    Holds made ready by other processes are picked up by `refresh`. A hold's expiry is set
+    when it is served, so new ready holds sort after those already read, and `refresh` only
+    seeks past the latest expiry read, less `REFRESH_OVERLAP` for transactions that
+    committed late.
+    """
+    REFRESH_OVERLAP = timedelta(minutes=1)
+
+    def __init__(self):
+        self.entries = []
+        self.hold_ids = set()
+        self.loaded = False
+        # Latest expiry read from the database
+        self.read_until = None
+        self.lock = threading.Lock()
+
+    def load(self, session) -> None:
+        """
+        Rebuild the heap from the ready holds, dropping stale entries.
+        """
+        entries = [tuple(row) for row in session.execute(select(Hold.expires_at, Hold.id).where(Hold.status == holdStatuses.READY))]
+        heapq.heapify(entries)
+        with self.lock:
+            self.entries = entries
+            self.hold_ids = {hold_id for _, hold_id in entries}
+            self.read_until = max((expires_at for expires_at, _ in entries), default=None)
+            self.loaded = True
+
+    def refresh(self, session) -> None:
+        """
+        Add the holds made ready since the last load or refresh, by any process.
+        """
+        if not self.loaded:
+            return self.load(session)
+        statement = select(Hold.expires_at, Hold.id).where(Hold.status == holdStatuses.READY)
+        if self.read_until is not None:
+            statement = statement.where(Hold.expires_at >= self.read_until - self.REFRESH_OVERLAP)
+        for expires_at, hold_id in session.execute(statement).all():
+            self.push(expires_at, hold_id)
+            if self.read_until is None or expires_at > self.read_until:
+                self.read_until = expires_at
+
+    def push(self, expires_at: datetime, hold_id: int) -> None:
+        with self.lock:
+            if hold_id not in self.hold_ids:
+                heapq.heappush(self.entries, (expires_at, hold_id))
+                self.hold_ids.add(hold_id)
+
+    def pop_due(self, now: datetime) -> list:
+        """
+        Remove and return the ids of the holds due to expire by `now`, soonest first.
+        """
+        due = []
+        with self.lock:
+            while self.entries and self.entries[0][0] <= now:
+                hold_id = heapq.heappop(self.entries)[1]
+                self.hold_ids.discard(hold_id)
+                due.append(hold_id)
+        return due
+
+    def next_expiry(self) -> datetime:
+        with self.lock:
+            return self.entries[0][0] if self.entries else None
+
+
+EXPIRY = ExpiryHeap()
+
+
+def allocate(session, book_id: int) -> int:
+    """
+    Set the book's available copies aside for the head of its queue, one copy per waiting
+    hold, without committing. Every allocation is a few primary-key and index-seek writes,
+    so its cost does not depend on the length of the queue. Returns the holds served.
+    """
+    served = 0
+    while True:
+        hold_id = session.execute(
+            select(Hold.id)
+            .where(Hold.book_id == book_id, Hold.status == holdStatuses.WAITING)
+            .order_by(Hold.priority, Hold.id)
+            .limit(1)
+        ).scalar()
+        if hold_id is None:
+            return served
+        book_claimed = session.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.available_copies > 0)
+            .values(available_copies=Book.available_copies - 1)
+        ).rowcount
+        if not book_claimed:
+            return served
+
+        copy_id, = checkout_copies(session, [book_id], copyStatuses.HELD)
+        expires_at = datetime.now() + timedelta(days=baseConfig.HOLD_PICKUP_DAYS)
+        session.execute(
+            update(Hold)
+            .where(Hold.id == hold_id)
+            .values(status=holdStatuses.READY, copy_id=copy_id, expires_at=expires_at)
+        )
+        EXPIRY.push(expires_at, hold_id)
+        LOGGER.info(f"Hold {hold_id} on book {book_id} is ready with copy {copy_id} until {expires_at:%Y-%m-%d %H:%M}")
+        served += 1
+
+
+def release_copy(session, book_id: int, copy_id: int) -> None:
+    """
+    Give a copy set aside for a hold back to the shelf and serve the next hold, without committing.
+    """
+    session.execute(update(Copy).where(Copy.id == copy_id, Copy.status == copyStatuses.HELD).values(status=copyStatuses.AVAILABLE))
+    session.execute(update(Book).where(Book.id == book_id).values(available_copies=Book.available_copies + 1))
+    allocate(session, book_id)
+
+
+def claim(session, book_id: int, user_id: int) -> int:
+    """
+    Mark the user's ready hold on the book as fulfilled without committing and return the
+    id of the copy set aside for it, or None when the user has no ready hold on the book.
+    """
+    return session.execute(
+        update(Hold)
+        .where(Hold.book_id == book_id, Hold.user_id == user_id, Hold.status == holdStatuses.READY)
+        .values(status=holdStatuses.FULFILLED)
+        .returning(Hold.copy_id)
+    ).scalar()
+
+
+def position(session, hold: Hold) -> int:
+    """
+    1-based place of a waiting hold in its book's queue.
+    """
+    return session.execute(
+        select(func.count())
+        .select_from(Hold)
+        .where(
+            Hold.book_id == hold.book_id,
+            Hold.status == holdStatuses.WAITING,
+            tuple_(Hold.priority, Hold.id) < tuple_(hold.priority, hold.id),
+        )
+    ).scalar() + 1
+
+
+def place(session, book_id: int, user_id: int, priority: int = 0) -> Hold:
+    """
+    Queue the user for the book and commit. Raises HoldError when a copy can be reserved
+    right away or the user already borrows or waits for the book.
+    """
+    if session.execute(select(Book.available_copies).where(Book.id == book_id)).scalar():
+        raise HoldError(HoldError.AVAILABLE, "A copy of the selected book is available, reserve it instead.")
+    borrowed = session.execute(
+        select(Request.id).where(Request.book_id == book_id, Request.user_id == user_id, Request.return_date.is_(None)).limit(1)
+    ).scalar()
+    if borrowed is not None:
+        raise HoldError(HoldError.ALREADY_BORROWED, "You already have a copy of the selected book.")
+
+    try:
+        hold = session.scalars(
+            insert(Hold).values(book_id=book_id, user_id=user_id, priority=priority).returning(Hold)
+        ).one()
+        # A copy returned since the availability check goes to the queue rather than sitting on the shelf
+        allocate(session, book_id)
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HoldError(HoldError.ALREADY_HOLDING, "You are already in the queue for the selected book.")
+    session.refresh(hold)
+    LOGGER.info(f"Placed hold: {hold}")
+    return hold
+
+
+def cancel(session, hold_id: int, user_id: int) -> bool:
+    """
+    Withdraw a waiting or ready hold of the user and commit; a copy set aside for it goes
+    to the next hold in the queue.
+    """
+    row = session.execute(
+        update(Hold)
+        .where(Hold.id == hold_id, Hold.user_id == user_id, Hold.status.in_([holdStatuses.WAITING, holdStatuses.READY]))
+        .values(status=holdStatuses.CANCELLED)
+        .returning(Hold.book_id, Hold.copy_id)
+    ).first()
+    if row is None:
+        session.rollback()
+        return False
+    book_id, copy_id = row
+    if copy_id is not None:
+        release_copy(session, book_id, copy_id)
+    session.commit()
+    LOGGER.info(f"Cancelled hold {hold_id}")
+    return True
+
+
+def receive_copies(book: Book, count: int) -> int:
+    """
+    Add new copies to the book and hand them to its queue in the same transaction, so a
+    reservation cannot take a new copy ahead of the waiting holds. Refreshes the book's
+    counters and returns the holds served.
+    """
+    with session_scope() as session:
+        add_copies(session, {book.id: count})
+        served = allocate(session, book.id)
+        session.commit()
+        total_copies, available_copies = session.execute(select(Book.total_copies, Book.available_copies).where(Book.id == book.id)).one()
+    set_committed_value(book, 'total_copies', total_copies)
+    set_committed_value(book, 'available_copies', available_copies)
+    LOGGER.info(f"Added {count} copies: {book}")
+    return served
+
+
+def expire(session, now: datetime = None) -> int:
+    """
+    Expire the ready holds whose pickup window has passed and commit, including holds made
+    ready by other processes. Their copies go to the next holds in the queue, or back on the
+    shelf. Returns the number of holds expired.
+    """
+    now = now or datetime.now()
+    EXPIRY.refresh(session)
+    expired = 0
+    for hold_id in EXPIRY.pop_due(now):
+        row = session.execute(
+            update(Hold)
+            .where(Hold.id == hold_id, Hold.status == holdStatuses.READY, Hold.expires_at <= now)
+            .values(status=holdStatuses.EXPIRED)
+            .returning(Hold.book_id, Hold.copy_id)
+        ).first()
+        if row is None:
+            continue
+        release_copy(session, *row)
+        expired += 1
+        LOGGER.info(f"Expired hold {hold_id}")
+    session.commit()
+    return expired
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hold queue maintenance.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('expire', help='Expire the ready holds that were not picked up in time.')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with session_scope() as session:
+        expired = expire(session)
+    print(f"Expired {expired} holds in {time.perf_counter() - started:.2f}s")
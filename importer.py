@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import time
+import argparse
+from itertools import islice
+
+from sqlalchemy import insert, select
+
+from config import databaseConfig
+from models import Author, Publisher, Book, ImportCheckpoint, add_copies
+from utils import check_isbn
+from logger import LOGGER
+from search import fulltext
+
+
+FIELDS = ['book_name', 'isbn', 'author_first_name', 'author_last_name', 'publisher_name', 'publisher_city', 'publish_year', 'volume']
+DEFAULT_BATCH_SIZE = 5000
+
+
+def read_rows(path: str, file_format: str):
+    """
+    Stream records from a CSV file with a header row or a JSON Lines file.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _optional_int(value):
+    if value is None or str(value).strip() == '':
+        return None
+    return int(value)
+
+
+def parse_row(row: dict) -> dict:
+    """
+    Validate and normalize one record the same way the Add Book dialogs do.
+    Raises ValueError for a record that cannot be imported.
+    """
+    missing = [field for field in FIELDS[:6] if not str(row.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    is_valid_isbn, isbn = check_isbn(str(row['isbn']).strip())
+    if not is_valid_isbn:
+        raise ValueError(f"invalid ISBN {row['isbn']!r}")
+
+    return {
+        'book_name': row['book_name'].strip().title(),
+        'isbn': isbn,
+        'author': (row['author_first_name'].strip().title(), row['author_last_name'].strip().title()),
+        'publisher': (row['publisher_name'].strip().title(), row['publisher_city'].strip().capitalize()),
+        'publish_year': _optional_int(row.get('publish_year')),
+        'volume': _optional_int(row.get('volume')),
+    }
+
+
+class CatalogImporter:
+    """
+    Load books in large transactions, resolving authors and publishers through
+    in-memory maps so each batch costs a handful of statements instead of several per row.
+    The position in the source is saved in the same transaction as the batch,
+    so a failed run resumes exactly after the last committed batch.
+    """
+
+    def __init__(self, path: str, file_format: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.source = os.path.abspath(path)
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.authors = {}
+        self.publishers = {}
+        self.imported = 0
+        self.rejected = 0
+
+    def load_reference_data(self, session) -> None:
+        for id, first_name, last_name in session.execute(select(Author.id, Author.first_name, Author.last_name)):
+            self.authors[(first_name, last_name)] = id
+        for id, publisher_name, city in session.execute(select(Publisher.id, Publisher.publisher_name, Publisher.city)):
+            self.publishers[(publisher_name, city)] = id
+
+    def resolve_authors(self, session, keys: set) -> None:
+        new_keys = [key for key in keys if key not in self.authors]
+        if new_keys:
+            statement = insert(Author).returning(Author.id, Author.first_name, Author.last_name)
+            for id, first_name, last_name in session.execute(statement, [{'first_name': first, 'last_name': last} for first, last in new_keys]):
+                self.authors[(first_name, last_name)] = id
+
+    def resolve_publishers(self, session, keys: set) -> None:
+        new_keys = [key for key in keys if key not in self.publishers]
+        if new_keys:
+            statement = insert(Publisher).returning(Publisher.id, Publisher.publisher_name, Publisher.city)
+            for id, publisher_name, city in session.execute(statement, [{'publisher_name': name, 'city': city} for name, city in new_keys]):
+                self.publishers[(publisher_name, city)] = id
+
+    def import_batch(self, session, rows: list, position: int) -> None:
+        self.resolve_authors(session, {row['author'] for row in rows})
+        self.resolve_publishers(session, {row['publisher'] for row in rows})
+
+        book_ids = []
+        if rows:
+            statement = insert(Book).returning(Book.id)
+            book_ids = session.scalars(statement, [{
+                'book_name': row['book_name'],
+                'isbn': row['isbn'],
+                'author_id': self.authors[row['author']],
+                'publisher_id': self.publishers[row['publisher']],
+                'publish_year': row['publish_year'],
+                'volume': row['volume'],
+            } for row in rows]).all()
+            # The feed lists titles, not holdings: every imported title starts with one copy
+            add_copies(session, {book_id: 1 for book_id in book_ids})
+        fulltext.sync_books(session, book_ids)
+
+        session.merge(ImportCheckpoint(source=self.source, position=position))
+        session.commit()
+
+    def run(self) -> None:
+        with databaseConfig.Session() as session:
+            checkpoint = session.get(ImportCheckpoint, self.source)
+            position = checkpoint.position if checkpoint else 0
+            if position:
+                LOGGER.info(f"Resuming import of {self.path} after record {position}")
+            self.load_reference_data(session)
+
+            records = islice(read_rows(self.path, self.file_format), position, None)
+            started = time.perf_counter()
+            while True:
+                chunk = list(islice(records, self.batch_size))
+                if not chunk:
+                    break
+
+                rows = []
+                for offset, record in enumerate(chunk, start=position + 1):
+                    try:
+                        rows.append(parse_row(record))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        self.rejected += 1
+                        LOGGER.warning(f"Skipping record {offset}: {e}")
+
+                position += len(chunk)
+                try:
+                    self.import_batch(session, rows, position)
+                except Exception:
+                    session.rollback()
+                    LOGGER.error(f"Import failed in the batch ending at record {position}; rerun to resume")
+                    raise
+
+                self.imported += len(rows)
+                elapsed = time.perf_counter() - started
+                LOGGER.info(f"Imported {self.imported} books ({self.imported / elapsed:.0f} rows/s), rejected {self.rejected}")
+
+        elapsed = time.perf_counter() - started
+        print(f"Imported {self.imported} books in {elapsed:.1f}s ({self.imported / elapsed if elapsed else 0:.0f} rows/s), rejected {self.rejected}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import a book catalog from CSV or JSON Lines.')
+    parser.add_argument('path', help=f"file with the fields: {', '.join(FIELDS)}")
+    parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    file_format = args.file_format or ('jsonl' if args.path.endswith(('.jsonl', '.json')) else 'csv')
+    CatalogImporter(args.path, file_format, args.batch_size).run()
@@ -0,0 +1,122 @@
+import importlib
+import pkgutil
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, select, delete, func, text
+
+from logger import LOGGER
+
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.now),
+)
+
+
+def discover() -> list:
+    """
+    Return the migration modules of this package ordered by version.
+    Each module is named v<version>_<name> and defines upgrade(connection) and
+    downgrade(connection). Modules with ONLINE = True run outside a transaction,
+    so their indexes can be built without blocking writes.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        version, _, name = module_info.name[1:].partition('_')
+        if not module_info.name.startswith('v') or not version.isdigit():
+            continue
+        module = importlib.import_module(f'{__name__}.{module_info.name}')
+        module.VERSION, module.NAME = int(version), name
+        migrations.append(module)
+    return sorted(migrations, key=lambda migration: migration.VERSION)
+
+
+def current_version(engine) -> int:
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        return connection.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def _run(engine, migration, step) -> None:
+    if getattr(migration, 'ONLINE', False):
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            step(connection)
+        with engine.begin() as connection:
+            _record(connection, migration, step)
+    else:
+        with engine.begin() as connection:
+            step(connection)
+            _record(connection, migration, step)
+
+
+def _record(connection, migration, step) -> None:
+    if step is migration.upgrade:
+        connection.execute(schema_migrations.insert().values(version=migration.VERSION, name=migration.NAME))
+    else:
+        connection.execute(delete(schema_migrations).where(schema_migrations.c.version == migration.VERSION))
+
+
+def upgrade(engine, target: int = None) -> int:
+    """
+    Apply every migration newer than the current version up to `target` (default: latest).
+    Returns the resulting version.
+    """
+    version = current_version(engine)
+    for migration in discover():
+        if version < migration.VERSION and (target is None or migration.VERSION <= target):
+            LOGGER.info(f"Upgrading to {migration.VERSION} ({migration.NAME})")
+            _run(engine, migration, migration.upgrade)
+            version = migration.VERSION
+    return version
+
+
+def downgrade(engine, target: int) -> int:
+    """
+    Revert every applied migration newer than `target`, newest first.
+    Returns the resulting version.
+    """
+    version = current_version(engine)
+    for migration in reversed(discover()):
+        if target < migration.VERSION <= version:
+            LOGGER.info(f"Downgrading from {migration.VERSION} ({migration.NAME})")
+            _run(engine, migration, migration.downgrade)
+    return min(version, target)
+
+
+def has_column(connection, table: str, column: str) -> bool:
+    return column in {existing['name'] for existing in inspect(connection).get_columns(table)}
+
+
+def add_column(connection, table: str, column: str, ddl: str) -> None:
+    if not has_column(connection, table, column):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def drop_column(connection, table: str, column: str) -> None:
+    if has_column(connection, table, column):
+        connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+
+def _concurrently(connection) -> str:
+    # Only PostgreSQL can build an index without locking out writers, and only outside a transaction
+    online = connection.get_execution_options().get('isolation_level') == 'AUTOCOMMIT'
+    return 'CONCURRENTLY ' if online and connection.dialect.name == 'postgresql' else ''
+
+
+def create_index(connection, name: str, table: str, expressions: str, unique: bool = False, where: str = None) -> None:
+    """
+    Create an index unless one with that name exists; built concurrently on PostgreSQL
+    when the migration runs online. A failed concurrent build leaves an invalid index
+    behind that has to be dropped before retrying.
+    """
+    statement = f"CREATE {'UNIQUE ' if unique else ''}INDEX {_concurrently(connection)}IF NOT EXISTS {name} ON {table} ({expressions})"
+    if where:
+        statement += f" WHERE {where}"
+    connection.execute(text(statement))
+
+
+def drop_index(connection, name: str) -> None:
+    connection.execute(text(f"DROP INDEX {_concurrently(connection)}IF EXISTS {name}"))
@@ -0,0 +1,34 @@
+import argparse
+
+from config import databaseConfig
+from migrations import current_version, upgrade, downgrade, discover
+from migrations.explain import report
+
+
+parser = argparse.ArgumentParser(prog='python -m migrations', description='Manage the database schema.')
+commands = parser.add_subparsers(dest='command', required=True)
+upgrade_parser = commands.add_parser('upgrade', help='Apply pending migrations.')
+upgrade_parser.add_argument('--to', type=int, default=None, help='Stop at this version (default: latest).')
+downgrade_parser = commands.add_parser('downgrade', help='Revert migrations newer than a version.')
+downgrade_parser.add_argument('--to', type=int, required=True, help='Version to return to; 0 drops everything.')
+commands.add_parser('status', help='Show the applied and pending migrations.')
+commands.add_parser('explain', help='Print the plans of the hot queries and flag full-table scans.')
+args = parser.parse_args()
+
+engine = databaseConfig.engine
+if args.command == 'upgrade':
+    try:
+        print(f"Schema at version {upgrade(engine, args.to)}")
+    except RuntimeError as e:
+        raise SystemExit(f"Upgrade stopped at version {current_version(engine)}: {e}")
+elif args.command == 'downgrade':
+    print(f"Schema at version {downgrade(engine, args.to)}")
+elif args.command == 'status':
+    version = current_version(engine)
+    for migration in discover():
+        print(f"{'applied' if migration.VERSION <= version else 'pending':<8} {migration.VERSION:03d} {migration.NAME}")
+else:
+    flagged = report(engine)
+    if flagged:
+        print(f"{len(flagged)} hot queries scan a full table: {', '.join(flagged)}")
+        raise SystemExit(1)
@@ -0,0 +1,67 @@
+"""
+EXPLAIN plans for the queries on the application's hot paths.
+"""
+import re
+from datetime import date
+from sqlalchemy import select, func, tuple_
+
+from config import holdStatuses
+from models import User, Book, Request, Hold, Notification
+
+
+HOT_QUERIES = {
+    'sign in by email': select(User).where(func.lower(User.email) == 'student@example.com'),
+    'user loan counter': select(User.active_loans).where(User.id == 1),
+    'book loan counter': select(Book.active_loans).where(Book.id == 1),
+    'user open requests': select(Request).where(Request.user_id == 1, Request.return_date.is_(None)).order_by(Request.id),
+    'user request history': select(Request).where(Request.user_id == 1).order_by(Request.id),
+    'book open request': select(Request.id).where(Request.book_id == 1, Request.return_date.is_(None)),
+    'book request history': select(Request).where(Request.book_id == 1),
+    'open requests': select(Request).where(Request.return_date.is_(None)),
+    'book by isbn': select(Book).where(Book.isbn == '9780747532699'),
+    'books by author': select(Book).where(Book.author_id == 1),
+    'book hold queue head': select(Hold.id).where(Hold.book_id == 1, Hold.status == holdStatuses.WAITING).order_by(Hold.priority, Hold.id).limit(1),
+    'ready holds': select(Hold.expires_at, Hold.id).where(Hold.status == holdStatuses.READY),
+    'user holds': select(Hold).where(Hold.user_id == 1, Hold.status.in_([holdStatuses.WAITING, holdStatuses.READY])),
+    'upcoming deadlines': (
+        select(Request.id, Request.return_deadline)
+        .where(Request.return_date.is_(None), tuple_(Request.return_deadline, Request.id) > tuple_(date(2024, 1, 1), 1))
+        .order_by(Request.return_deadline, Request.id)
+        .limit(1000)
+    ),
+    'undelivered notifications': select(Notification).where(Notification.delivered_at.is_(None)).order_by(Notification.id).limit(1000),
+}
+
+# Plan lines that read a whole table rather than seeking through an index
+FULL_SCANS = {
+    'sqlite': re.compile(r'^SCAN (?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+}
+
+
+def explain(connection, statement) -> list:
+    """
+    Return the plan lines of `statement` on the connection's backend.
+    """
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        return [row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    return [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {sql}")]
+
+
+def report(engine) -> list:
+    """
+    Print the plan of every hot query and return the names of those that scan a full table.
+    """
+    full_scan = FULL_SCANS.get(engine.dialect.name)
+    flagged = []
+    with engine.connect() as connection:
+        for name, statement in HOT_QUERIES.items():
+            plan = explain(connection, statement)
+            scans = full_scan is not None and any(full_scan.search(line) for line in plan)
+            if scans:
+                flagged.append(name)
+            print(f"{'FULL SCAN' if scans else 'ok':<9}  {name}")
+            for line in plan:
+                print(f"           {line}")
+    return flagged
@@ -0,0 +1,51 @@
+"""
+Unique keys that Author.create and Publisher.create upsert on, and the import checkpoints table.
+The original Author.create and Publisher.create looked names up as typed but stored them
+title-cased, so re-entering a name in lower case inserted a duplicate; those are merged
+into the oldest row before the keys are created.
+"""
+from sqlalchemy import text
+
+from models import Base, ImportCheckpoint
+from migrations import create_index, drop_index
+from logger import LOGGER
+
+
+REFERENCES = [
+    ('authors', ['first_name', 'last_name'], 'author_id'),
+    ('publishers', ['publisher_name', 'city'], 'publisher_id'),
+]
+
+
+def merge_duplicates(connection, table: str, key: list, foreign_key: str) -> int:
+    """
+    Point the books of every duplicate row of `table` at the row with the lowest id and the same
+    `key`, then delete the duplicates. Returns the number of rows deleted.
+    """
+    same_key = ' AND '.join(f"original.{column} = duplicate.{column}" for column in key)
+    connection.execute(text(
+        f"UPDATE books SET {foreign_key} = ("
+        f"SELECT min(original.id) FROM {table} original JOIN {table} duplicate ON {same_key} WHERE duplicate.id = books.{foreign_key}"
+        f") WHERE {foreign_key} IN ("
+        f"SELECT duplicate.id FROM {table} duplicate JOIN {table} original ON {same_key} AND original.id < duplicate.id)"
+    ))
+    return connection.execute(text(
+        f"DELETE FROM {table} WHERE id IN ("
+        f"SELECT duplicate.id FROM {table} duplicate JOIN {table} original ON {same_key} AND original.id < duplicate.id)"
+    )).rowcount
+
+
+def upgrade(connection) -> None:
+    for table, key, foreign_key in REFERENCES:
+        merged = merge_duplicates(connection, table, key, foreign_key)
+        if merged:
+            LOGGER.warning(f"Merged {merged} duplicate {table} into their oldest entry")
+    create_index(connection, 'uq_authors_name', 'authors', 'first_name, last_name', unique=True)
+    create_index(connection, 'uq_publishers_name_city', 'publishers', 'publisher_name, city', unique=True)
+    Base.metadata.create_all(connection, tables=[ImportCheckpoint.__table__])
+
+
+def downgrade(connection) -> None:
+    Base.metadata.drop_all(connection, tables=[ImportCheckpoint.__table__])
+    drop_index(connection, 'uq_publishers_name_city')
+    drop_index(connection, 'uq_authors_name')
@@ -0,0 +1,16 @@
+"""
+Full-text search structures, populated from the existing catalog.
+"""
+from sqlalchemy.orm import Session
+
+from search import fulltext
+
+
+def upgrade(connection) -> None:
+    fulltext.create_index(connection)
+    with Session(bind=connection) as session:
+        fulltext.rebuild(session)
+
+
+def downgrade(connection) -> None:
+    fulltext.drop_index(connection)
@@ -0,0 +1,46 @@
+"""
+Active-loan counters on users and books, backfilled from the open requests, and the
+partial unique index that allows one open request per book.
+"""
+from itertools import groupby
+from sqlalchemy import text
+
+from migrations import add_column, drop_column, create_index, drop_index
+
+
+def check_open_requests(connection) -> None:
+    """
+    The original reserve_book could lend a book twice. Raise RuntimeError listing such books,
+    since only a librarian can tell which of the loans is real.
+    """
+    rows = connection.execute(text(
+        "SELECT book_id, id FROM requests WHERE return_date IS NULL AND book_id IN ("
+        "SELECT book_id FROM requests WHERE return_date IS NULL GROUP BY book_id HAVING count(*) > 1"
+        ") ORDER BY book_id, id"
+    )).all()
+    if rows:
+        books = [
+            f"  book {book_id}: requests {', '.join(str(id) for _, id in requests)}"
+            for book_id, requests in groupby(rows, key=lambda row: row[0])
+        ]
+        raise RuntimeError(
+            "These books have more than one open request. Close all but one request of each "
+            "(set its return_date), then rerun the upgrade:\n" + "\n".join(books)
+        )
+
+
+def upgrade(connection) -> None:
+    check_open_requests(connection)
+    for table, column in (('users', 'user_id'), ('books', 'book_id')):
+        add_column(connection, table, 'active_loans', "INTEGER NOT NULL DEFAULT 0")
+        connection.execute(text(
+            f"UPDATE {table} SET active_loans = "
+            f"(SELECT count(*) FROM requests WHERE requests.{column} = {table}.id AND requests.return_date IS NULL)"
+        ))
+    create_index(connection, 'uq_requests_open_book', 'requests', 'book_id', unique=True, where='return_date IS NULL')
+
+
+def downgrade(connection) -> None:
+    drop_index(connection, 'uq_requests_open_book')
+    drop_column(connection, 'books', 'active_loans')
+    drop_column(connection, 'users', 'active_loans')
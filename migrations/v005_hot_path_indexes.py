@@ -0,0 +1,27 @@
+"""
+Indexes behind the sign-in, reservation, return and catalog lookups.
+Run online so a large requests table stays writable while they build.
+"""
+from migrations import create_index, drop_index
+
+
+ONLINE = True
+
+INDEXES = [
+    ('ix_users_email_lower', 'users', 'lower(email)'),
+    ('ix_requests_user_id', 'requests', 'user_id, return_date'),
+    ('ix_requests_book_id', 'requests', 'book_id'),
+    ('ix_requests_return_date', 'requests', 'return_date'),
+    ('ix_books_isbn', 'books', 'isbn'),
+    ('ix_books_author_id', 'books', 'author_id'),
+]
+
+
+def upgrade(connection) -> None:
+    for name, table, expressions in INDEXES:
+        create_index(connection, name, table, expressions)
+
+
+def downgrade(connection) -> None:
+    for name, _, _ in reversed(INDEXES):
+        drop_index(connection, name)
@@ -0,0 +1,12 @@
+"""
+Cold tier for closed requests moved out of `requests` by the archiver.
+"""
+from models import Base, RequestHistory
+
+
+def upgrade(connection) -> None:
+    Base.metadata.create_all(connection, tables=[RequestHistory.__table__])
+
+
+def downgrade(connection) -> None:
+    Base.metadata.drop_all(connection, tables=[RequestHistory.__table__])
@@ -0,0 +1,48 @@
+"""
+Physical copies of each book with total/available counters on books, and requests that
+lend a specific copy. Existing books get a single copy, lent out when the book has an open request.
+"""
+from sqlalchemy import text
+
+from migrations import add_column, drop_column, create_index, drop_index
+from models import Base, Copy
+
+
+def upgrade(connection) -> None:
+    Base.metadata.create_all(connection, tables=[Copy.__table__])
+    add_column(connection, 'books', 'total_copies', "INTEGER NOT NULL DEFAULT 0")
+    add_column(connection, 'books', 'available_copies', "INTEGER NOT NULL DEFAULT 0")
+    add_column(connection, 'requests', 'copy_id', "INTEGER REFERENCES copies (id)")
+    add_column(connection, 'requests_history', 'copy_id', "INTEGER")
+
+    connection.execute(text(
+        "INSERT INTO copies (book_id, barcode, status, created_at) "
+        "SELECT id, CAST(id AS VARCHAR) || '-1', CASE WHEN EXISTS (SELECT 1 FROM requests WHERE requests.book_id = books.id AND requests.return_date IS NULL) THEN 'on_loan' ELSE 'available' END, CURRENT_TIMESTAMP "
+        "FROM books WHERE NOT EXISTS (SELECT 1 FROM copies WHERE copies.book_id = books.id)"
+    ))
+    connection.execute(text(
+        "UPDATE books SET "
+        "total_copies = (SELECT count(*) FROM copies WHERE copies.book_id = books.id), "
+        "available_copies = (SELECT count(*) FROM copies WHERE copies.book_id = books.id AND copies.status = 'available')"
+    ))
+    for table in ('requests', 'requests_history'):
+        connection.execute(text(
+            f"UPDATE {table} SET copy_id = (SELECT min(copies.id) FROM copies WHERE copies.book_id = {table}.book_id) "
+            f"WHERE copy_id IS NULL"
+        ))
+
+    create_index(connection, 'uq_requests_open_copy', 'requests', 'copy_id', unique=True, where='return_date IS NULL')
+    drop_index(connection, 'uq_requests_open_book')
+
+
+def downgrade(connection) -> None:
+    # Titles go back to lending a single copy; fails if a book has several copies out
+    create_index(connection, 'uq_requests_open_book', 'requests', 'book_id', unique=True, where='return_date IS NULL')
+    drop_index(connection, 'uq_requests_open_copy')
+    drop_column(connection, 'requests_history', 'copy_id')
+    # SQLite cannot drop a column that carries a foreign key; the unused column stays behind there
+    if connection.dialect.name != 'sqlite':
+        drop_column(connection, 'requests', 'copy_id')
+    drop_column(connection, 'books', 'available_copies')
+    drop_column(connection, 'books', 'total_copies')
+    Base.metadata.drop_all(connection, tables=[Copy.__table__])
@@ -0,0 +1,20 @@
+"""
+Per-book hold queues, and copies set aside for the holds being served.
+"""
+from sqlalchemy import text
+
+from models import Base, Hold
+
+
+def upgrade(connection) -> None:
+    Base.metadata.create_all(connection, tables=[Hold.__table__])
+
+
+def downgrade(connection) -> None:
+    # Copies set aside for ready holds go back on the shelf
+    connection.execute(text(
+        "UPDATE books SET available_copies = available_copies + "
+        "(SELECT count(*) FROM copies WHERE copies.book_id = books.id AND copies.status = 'held')"
+    ))
+    connection.execute(text("UPDATE copies SET status = 'available' WHERE status = 'held'"))
+    Base.metadata.drop_all(connection, tables=[Hold.__table__])
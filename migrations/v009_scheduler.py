@@ -0,0 +1,19 @@
+"""
+Notification outbox and the open-deadline index the scheduler reads its batches from.
+Run online so a large requests table stays writable while the index builds.
+"""
+from migrations import create_index, drop_index
+from models import Base, Notification
+
+
+ONLINE = True
+
+
+def upgrade(connection) -> None:
+    Base.metadata.create_all(connection, tables=[Notification.__table__])
+    create_index(connection, 'ix_requests_open_deadline', 'requests', 'return_date, return_deadline, id')
+
+
+def downgrade(connection) -> None:
+    drop_index(connection, 'ix_requests_open_deadline')
+    Base.metadata.drop_all(connection, tables=[Notification.__table__])
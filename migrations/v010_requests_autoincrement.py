@@ -0,0 +1,47 @@
+"""
+Never reuse a request id. Without AUTOINCREMENT, SQLite hands the highest id to the next
+loan once the archiver has moved that request to requests_history, which leaves two
+requests with the same id. The table is rebuilt with AUTOINCREMENT and its sequence starts
+above every id ever used, archived or live; live loans that already share an id with an
+archived one get new ids. PostgreSQL sequences never reuse ids, so nothing changes there.
+"""
+from sqlalchemy import text, select, insert, func, union_all
+
+from models import Request, RequestHistory
+from logger import LOGGER
+
+
+def upgrade(connection) -> None:
+    if connection.dialect.name != 'sqlite':
+        return
+
+    sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'requests'")).scalar()
+    if 'AUTOINCREMENT' not in sql.upper():
+        connection.execute(text("ALTER TABLE requests RENAME TO requests_old"))
+        for name in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'requests_old' AND sql IS NOT NULL")).scalars().all():
+            connection.execute(text(f"DROP INDEX {name}"))
+        Request.__table__.create(connection)
+        columns = ', '.join(column.name for column in Request.__table__.columns)
+        connection.execute(text(f"INSERT INTO requests ({columns}) SELECT {columns} FROM requests_old"))
+        connection.execute(text("DROP TABLE requests_old"))
+
+    last_id = connection.execute(select(func.max(text('id'))).select_from(
+        union_all(select(Request.id), select(RequestHistory.id)).subquery()
+    )).scalar() or 0
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'requests'"))
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('requests', :seq)"), {'seq': last_id})
+
+    clashing = connection.execute(
+        select(Request.id).where(Request.id.in_(select(RequestHistory.id))).order_by(Request.id)
+    ).scalars().all()
+    for old_id in clashing:
+        values = dict(connection.execute(select(Request.__table__).where(Request.id == old_id)).mappings().one())
+        del values['id']
+        connection.execute(Request.__table__.delete().where(Request.id == old_id))
+        new_id = connection.execute(insert(Request.__table__).values(values).returning(Request.id)).scalar()
+        LOGGER.warning(f"Request {old_id} shared its id with an archived request and is now request {new_id}")
+
+
+def downgrade(connection) -> None:
+    # Going back to reusable ids would only bring the collision back; the rebuilt table stays
+    pass
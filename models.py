@@ -1,3 +1,5 @@
+from collections import Counter
+from contextlib import contextmanager
 from datetime import date, datetime, timedelta
 from sqlalchemy import (
     inspect,
@@ -7,39 +9,142 @@ from sqlalchemy import (
     DateTime,
     Date,
     ForeignKey,
+    Index,
+    text,
+    insert,
+    update,
+    select,
+    bindparam,
+    func,
+    union_all,
 )
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import relationship, as_declarative
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from config import databaseConfig, userRoles
+from config import baseConfig, databaseConfig, userRoles, copyStatuses, holdStatuses
 from utils import hash_password
 from logger import LOGGER
+from cache import ReferenceCache
+from search import fulltext, memory
+
+
+# Dialect-specific INSERT constructs that support ON CONFLICT
+UPSERT_INSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
+
+
+@contextmanager
+def session_scope():
+    """
+    Yield a session for one action, a single query or a single write. It is closed on exit,
+    so no connection stays checked out, or idle in a transaction, while a dialog waits for
+    input, and the next action reads the rows as they are now.
+    """
+    with databaseConfig.Session() as session:
+        yield session
 
 
 @as_declarative()
 class Base:
+    # Read-through cache for rarely changing reference tables, see Author and Publisher
+    cache = None
+
     @classmethod
     def get_by_id(cls, id: int):
-        with databaseConfig.Session() as session:
-            return session.query(cls).get(id)
+        if cls.cache is not None:
+            return cls.cache.get(id, lambda: cls._load_detached(id))
+        with session_scope() as session:
+            return session.get(cls, id)
 
-    def update(self, **kwargs):
-        if kwargs:
-            for key, value in kwargs.items():
-                if hasattr(self, key):
-                    setattr(self, key, value)
+    @classmethod
+    def _load_detached(cls, id: int):
+        # Cached instances are shared between threads, so they must not stay attached to a session
+        with session_scope() as session:
+            return session.get(cls, id)
+
+    @classmethod
+    def invalidate_cache(cls, id: int) -> None:
+        if cls.cache is not None:
+            cls.cache.invalidate(id)
+
+    @classmethod
+    def upsert(cls, conflict_columns: list, **values):
+        """
+        Insert a row, or return the existing row with the same unique key, in one
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement. The no-op update
+        is what makes RETURNING yield the existing row on a conflict.
+        """
+        insert = UPSERT_INSERTS.get(databaseConfig.engine.dialect.name)
+        with session_scope() as session:
+            if insert is None:
+                instance = session.query(cls).filter_by(**values).first()
+                if instance is None:
+                    instance = cls(**values)
+                    session.add(instance)
+            else:
+                statement = insert(cls).values(**values)
+                statement = statement.on_conflict_do_update(
+                    index_elements=conflict_columns,
+                    set_={conflict_columns[0]: statement.excluded[conflict_columns[0]]},
+                ).returning(cls)
+                instance = session.scalars(statement, execution_options={'populate_existing': True}).one()
+            session.commit()
+            return instance
+
+    def changed_columns(self, **kwargs) -> dict:
+        """
+        Map keyword arguments to the column values that actually differ from this instance.
+        Relationships are translated to their foreign key columns and win over a stale key value.
+        """
+        mapper = inspect(self).mapper
+        primary_keys = {column.key for column in mapper.primary_key}
+        values = {key: value for key, value in kwargs.items() if key in mapper.column_attrs and key not in primary_keys}
+        for key, value in kwargs.items():
+            if key in mapper.relationships and value is not None:
+                for local, remote in mapper.relationships[key].local_remote_pairs:
+                    values[mapper.get_property_by_column(local).key] = getattr(value, inspect(value).mapper.get_property_by_column(remote).key)
+        return {key: value for key, value in values.items() if getattr(self, key) != value}
 
-        with databaseConfig.Session() as session:
-            session.merge(self)
+    def update(self, **kwargs):
+        """
+        Write only the changed columns with a single UPDATE, reading the stored row back
+        through RETURNING where the backend supports it. Nothing is written if nothing changed.
+        """
+        changes = self.changed_columns(**kwargs)
+        if not changes:
+            return self
+
+        mapper = inspect(self).mapper
+        relationships = {key: value for key, value in kwargs.items() if key in mapper.relationships}
+        table = self.__table__
+        statement = update(table).where(*[column == getattr(self, column.key) for column in table.primary_key]).values(changes)
+        with session_scope() as session:
+            if session.get_bind().dialect.update_returning:
+                row = session.execute(statement.returning(*table.columns)).mappings().one()
+                changes = {mapper.get_property_by_column(column).key: row[column] for column in table.columns}
+            else:
+                session.execute(statement)
+            for key, value in changes.items():
+                set_committed_value(self, key, value)
+            for key, value in relationships.items():
+                set_committed_value(self, key, value)
+            fulltext.sync(session, self)
+            memory.sync(self)
             session.commit()
 
+        self.invalidate_cache(self.id)
         return self
 
     def delete(self):
         if self:
-            with databaseConfig.Session() as session:
+            with session_scope() as session:
+                fulltext.discard(session, self)
                 session.delete(self)
                 session.commit()
+            memory.discard(self)
+            self.invalidate_cache(self.id)
             LOGGER.info(f'delete: {self}')
             return True
         return False
@@ -57,6 +162,7 @@ class User(Base):
     last_name = Column(String, nullable=False)
     password = Column(String, nullable=False)
     role = Column(String, nullable=False)
+    active_loans = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime, default=datetime.now())
     updated_at = Column(DateTime, onupdate=datetime.now())
     updated_by_user_id = Column(Integer, ForeignKey("users.id"))
@@ -64,10 +170,16 @@ class User(Base):
     # Relationships
     updated_by_user = relationship("User")
 
+    __table_args__ = (Index('ix_users_email_lower', func.lower(email)),)
+
     @classmethod
-    def create(cls, id: int, email: str, first_name: str, last_name: str, role: str = userRoles.STUDENT) -> 'User':
+    def create(cls, id: int, email: str, first_name: str, last_name: str, role: str = userRoles.STUDENT, hashed_password: bytes = None) -> 'User':
+        """
+        Pass `hashed_password` when the hash was already made on the password worker pool;
+        otherwise the default password (the student ID) is hashed here.
+        """
         try:
-            with databaseConfig.Session() as session:
+            with session_scope() as session:
                 existing_user = session.query(User).filter((User.id == id) & (User.email == email.lower())).first()
                 if existing_user is None:
                     user = cls(
@@ -75,7 +187,7 @@ class User(Base):
                         email=email.lower(),
                         first_name=first_name.title(),
                         last_name=last_name.title(),
-                        password=hash_password(str(id)),
+                        password=hashed_password or hash_password(str(id)),
                         role=role,
                     )
                     session.add(user)
@@ -91,13 +203,22 @@ class User(Base):
             LOGGER.error(f"Unexpected error when creating user: {e}")
             raise e
 
-    def update_password(self, password: str, updated_by_user_id: int) -> bool:
-        self.password = hash_password(password)
-        self.updated_by_user_id = updated_by_user_id
-        with databaseConfig.Session() as session:
-            session.merge(self)
+    def update_password(self, hashed_password: bytes, updated_by_user_id: int) -> bool:
+        self.update(password=hashed_password, updated_by_user_id=updated_by_user_id)
+        return True
+
+    @classmethod
+    def rehash_password(cls, user_id: int, password: str) -> None:
+        """
+        Re-hash with the configured cost without recording it as a password change. Only the
+        stored row is written, so this can run on a worker thread while the caller keeps using
+        its User instance; the old hash on that instance still verifies the same password.
+        """
+        hashed_password = hash_password(password)
+        with session_scope() as session:
+            session.query(User).filter(User.id == user_id).update({User.password: hashed_password})
             session.commit()
-            return True
+        LOGGER.info(f"Rehashed password of user {user_id}")
 
     def __repr__(self) -> str:
         return f"<user id=\"{self.id}\" email=\"{self.email}\" role=\"{self.role}\">"
@@ -108,6 +229,8 @@ class User(Base):
 
 class Author(Base):
     __tablename__ = 'authors'
+    __table_args__ = (Index('uq_authors_name', 'first_name', 'last_name', unique=True),)
+    cache = ReferenceCache(baseConfig.REFERENCE_CACHE_SIZE, baseConfig.REFERENCE_CACHE_TTL)
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
     first_name = Column(String, nullable=False)
@@ -116,19 +239,11 @@ class Author(Base):
     @classmethod
     def create(cls, first_name: str, last_name: str) -> 'Author':
         try:
-            with databaseConfig.Session() as session:
-                existing_author = session.query(Author).filter((Author.first_name == first_name.title()) & (Author.last_name == last_name.title())).first()
-                if existing_author is None:
-                    author = cls(
-                        first_name=first_name.title(),
-                        last_name=last_name.title(),
-                    )
-                    session.add(author)
-                    session.commit()
-                    LOGGER.info(f"Created author: {author}")
-                else:
-                    LOGGER.warning(f"Author already exists in database: {existing_author}")
-                return session.query(Author).filter((Author.first_name == first_name.title()) & (Author.last_name == last_name.title())).first()
+            author = cls.upsert(['first_name', 'last_name'], first_name=first_name.title(), last_name=last_name.title())
+            memory.sync(author)
+            cls.invalidate_cache(author.id)
+            LOGGER.info(f"Created or found author: {author}")
+            return author
         except IntegrityError as e:
             LOGGER.error(e.orig)
             raise e.orig
@@ -145,6 +260,8 @@ class Author(Base):
 
 class Publisher(Base):
     __tablename__ = 'publishers'
+    __table_args__ = (Index('uq_publishers_name_city', 'publisher_name', 'city', unique=True),)
+    cache = ReferenceCache(baseConfig.REFERENCE_CACHE_SIZE, baseConfig.REFERENCE_CACHE_TTL)
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
     publisher_name = Column(String, nullable=False)
@@ -153,19 +270,11 @@ class Publisher(Base):
     @classmethod
     def create(cls, publisher_name: str, city: str) -> 'Publisher':
         try:
-            with databaseConfig.Session() as session:
-                existing_publisher = session.query(Publisher).filter((Publisher.publisher_name == publisher_name) & (Publisher.city == city)).first()
-                if existing_publisher is None:
-                    publisher = cls(
-                        publisher_name=publisher_name.title(),
-                        city=city.capitalize(),
-                    )
-                    session.add(publisher)
-                    session.commit()
-                    LOGGER.info(f"Created publisher: {publisher}")
-                else:
-                    LOGGER.warning(f"Publishers already exists in database: {existing_publisher}")
-                return session.query(Publisher).filter((Publisher.publisher_name == publisher_name) & (Publisher.city == city)).first()
+            publisher = cls.upsert(['publisher_name', 'city'], publisher_name=publisher_name.title(), city=city.capitalize())
+            memory.sync(publisher)
+            cls.invalidate_cache(publisher.id)
+            LOGGER.info(f"Created or found publisher: {publisher}")
+            return publisher
         except IntegrityError as e:
             LOGGER.error(e.orig)
             raise e.orig
@@ -185,32 +294,69 @@ class Book(Base):
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
     book_name = Column(String, nullable=False)
-    isbn = Column(String(13), nullable=False)
-    author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
+    isbn = Column(String(13), nullable=False, index=True)
+    author_id = Column(Integer, ForeignKey("authors.id"), nullable=False, index=True)
     publisher_id = Column(Integer, ForeignKey("publishers.id"), nullable=False)
     publish_year = Column(Integer)
     volume = Column(Integer)
+    active_loans = Column(Integer, nullable=False, default=0, server_default='0')
+    total_copies = Column(Integer, nullable=False, default=0, server_default='0')
+    available_copies = Column(Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     author = relationship("Author")
     publisher = relationship("Publisher")
+    copies = relationship("Copy", back_populates="book", cascade="all, delete-orphan")
 
     @classmethod
-    def create(cls, book_name: str, isbn: str, author: Author, publisher: Publisher, publish_year: int = None, volume: int = None) -> 'Book':
+    def create(cls, book_name: str, isbn: str, author: Author, publisher: Publisher, publish_year: int = None, volume: int = None, copies: int = 1) -> 'Book':
+        return cls.create_many([{
+            'book_name': book_name,
+            'isbn': isbn,
+            'author': author,
+            'publisher': publisher,
+            'publish_year': publish_year,
+            'volume': volume,
+            'copies': copies,
+        }])[0]
+
+    @classmethod
+    def create_many(cls, books: list) -> list:
+        """
+        Insert books given as dicts of `create` arguments with one INSERT ... RETURNING,
+        returning the stored rows in id order with `author` and `publisher` set.
+        Each book gets `copies` holdings (default 1) in the same transaction.
+        """
         try:
-            book = cls(
-                book_name=book_name.title(),
-                isbn=isbn,
-                author=author,
-                publisher=publisher,
-                publish_year=publish_year,
-                volume=volume,
-            )
-            with databaseConfig.Session() as session:
-                session.add(book)
+            with session_scope() as session:
+                created = []
+                # One INSERT per copy count, so every returned id gets the right number of holdings
+                for count in sorted({book.get('copies', 1) for book in books}):
+                    rows = [{
+                        'book_name': book['book_name'].title(),
+                        'isbn': book['isbn'],
+                        'author_id': book['author'].id,
+                        'publisher_id': book['publisher'].id,
+                        'publish_year': book.get('publish_year'),
+                        'volume': book.get('volume'),
+                    } for book in books if book.get('copies', 1) == count]
+                    inserted = session.scalars(insert(cls).returning(cls), rows).all()
+                    add_copies(session, {book.id: count for book in inserted})
+                    for book in inserted:
+                        set_committed_value(book, 'total_copies', count)
+                        set_committed_value(book, 'available_copies', count)
+                    created.extend(inserted)
+                created.sort(key=lambda book: book.id)
+                authors = {book['author'].id: book['author'] for book in books}
+                publishers = {book['publisher'].id: book['publisher'] for book in books}
+                for book in created:
+                    set_committed_value(book, 'author', authors[book.author_id])
+                    set_committed_value(book, 'publisher', publishers[book.publisher_id])
+                    memory.sync(book)
+                fulltext.sync_books(session, [book.id for book in created])
                 session.commit()
-                LOGGER.info(f"Created book: {book}")
-                return session.query(Book).filter(Book.id == book.id).first()
+            LOGGER.info(f"Created books: {created}")
+            return created
         except IntegrityError as e:
             LOGGER.error(e.orig)
             raise e.orig
@@ -219,8 +365,11 @@ class Book(Base):
             raise e
 
     def is_reserved(self) -> bool:
-        with databaseConfig.Session() as session:
-            return session.query(Request).filter(Request.book_id == self.id, Request.return_date == None).count() > 0
+        """
+        True when every copy of the title is out on loan.
+        """
+        with session_scope() as session:
+            return session.execute(select(Book.available_copies).where(Book.id == self.id)).scalar() == 0
 
     def __repr__(self) -> str:
         return f"<Book id=\"{self.id}\" book_name=\"{self.book_name}\"" + ((" volume=\"" + str(self.volume) + "\"") if self.volume != None else "") + ">"
@@ -229,44 +378,260 @@ class Book(Base):
         return self.book_name
 
 
+class Copy(Base):
+    """
+    One physical copy of a book, identified by its barcode.
+    """
+    __tablename__ = 'copies'
+    __table_args__ = (Index('ix_copies_book_id_status', 'book_id', 'status'),)
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    barcode = Column(String, unique=True, nullable=False)
+    status = Column(String, nullable=False, default=copyStatuses.AVAILABLE)
+    created_at = Column(DateTime, default=datetime.now)
+
+    # Relationships
+    book = relationship("Book", back_populates="copies")
+
+    def __repr__(self) -> str:
+        return f"<Copy id=\"{self.id}\" barcode=\"{self.barcode}\" status=\"{self.status}\">"
+
+
 class Request(Base):
     __tablename__ = 'requests'
+    __table_args__ = (
+        # At most one open request per copy; enforced by the database so concurrent reservations cannot both win
+        Index(
+            'uq_requests_open_copy', 'copy_id', unique=True,
+            sqlite_where=text('return_date IS NULL'),
+            postgresql_where=text('return_date IS NULL'),
+        ),
+        Index('ix_requests_user_id', 'user_id', 'return_date'),
+        # Open loans in deadline order, read in batches by the scheduler
+        Index('ix_requests_open_deadline', 'return_date', 'return_deadline', 'id'),
+        # SQLite would otherwise hand the id of an archived request to the next loan
+        {'sqlite_autoincrement': True},
+    )
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
-    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    copy_id = Column(Integer, ForeignKey("copies.id"))
     delivery_date = Column(Date, default=date.today(), nullable=False)
     return_deadline = Column(Date, default=date.today() + timedelta(days=14), nullable=False)
-    return_date = Column(Date, nullable=True)
+    return_date = Column(Date, nullable=True, index=True)
 
     # Relationships
     book = relationship("Book")
     user = relationship("User")
-
-    @classmethod
-    def create(cls, book: Book, user: User) -> 'Request':
-        try:
-            request = cls(book=book, user=user)
-            with databaseConfig.Session() as session:
-                session.add(request)
-                session.commit()
-                LOGGER.info(f"Created request: {request}")
-                return session.query(Request).filter(Request.id == request.id).first()
-        except IntegrityError as e:
-            LOGGER.error(e.orig)
-            raise e.orig
-        except SQLAlchemyError as e:
-            LOGGER.error(f"Unexpected error when creating request: {e}")
-            raise e
+    copy = relationship("Copy")
 
     def __repr__(self) -> str:
         return f"<Request id=\"{self.id}\" book=\"{self.book_id}\" user=\"{self.user_id}\">"
 
 
+class Hold(Base):
+    """
+    A user's place in the queue for a book with no copy left. Waiting holds are served by
+    ascending priority, then in the order they were placed; a served hold is ready with a
+    copy set aside until it is picked up or expires.
+    """
+    __tablename__ = 'holds'
+    __table_args__ = (
+        # Head of a book's queue is one index seek, however long the queue grows
+        Index('ix_holds_queue', 'book_id', 'status', 'priority', 'id'),
+        # At most one waiting or ready hold per user and book
+        Index(
+            'uq_holds_active', 'book_id', 'user_id', unique=True,
+            sqlite_where=text("status IN ('waiting', 'ready')"),
+            postgresql_where=text("status IN ('waiting', 'ready')"),
+        ),
+        Index('ix_holds_user_id', 'user_id', 'status'),
+        Index('ix_holds_status_expires_at', 'status', 'expires_at'),
+    )
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    copy_id = Column(Integer, ForeignKey("copies.id"))
+    priority = Column(Integer, nullable=False, default=0, server_default='0')
+    status = Column(String, nullable=False, default=holdStatuses.WAITING)
+    placed_at = Column(DateTime, nullable=False, default=datetime.now)
+    expires_at = Column(DateTime)
+
+    # Relationships
+    book = relationship("Book")
+    user = relationship("User")
+    copy = relationship("Copy")
+
+    def __repr__(self) -> str:
+        return f"<Hold id=\"{self.id}\" book=\"{self.book_id}\" user=\"{self.user_id}\" status=\"{self.status}\">"
+
+
+class RequestHistory(Base):
+    """
+    Closed requests moved out of `requests` by the archiver, keeping their original ids.
+    """
+    __tablename__ = 'requests_history'
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=False)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    copy_id = Column(Integer)
+    delivery_date = Column(Date, nullable=False)
+    return_deadline = Column(Date, nullable=False)
+    return_date = Column(Date, nullable=False)
+    archived_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    # Relationships
+    book = relationship("Book")
+    user = relationship("User")
+
+    def __repr__(self) -> str:
+        return f"<RequestHistory id=\"{self.id}\" book=\"{self.book_id}\" user=\"{self.user_id}\">"
+
+
+def _request_columns(model):
+    return select(model.id, model.book_id, model.user_id, model.copy_id, model.delivery_date, model.return_deadline, model.return_date)
+
+
+class RequestRecord(Base):
+    """
+    Read-only view of the whole circulation history: the live requests and the archived ones.
+    Use it wherever past loans matter; anything about open loans only needs Request.
+    """
+    __table__ = union_all(_request_columns(Request), _request_columns(RequestHistory)).subquery('request_records')
+
+    # Relationships
+    book = relationship("Book", primaryjoin="foreign(RequestRecord.book_id) == Book.id", viewonly=True)
+    user = relationship("User", primaryjoin="foreign(RequestRecord.user_id) == User.id", viewonly=True)
+
+    def __repr__(self) -> str:
+        return f"<RequestRecord id=\"{self.id}\" book=\"{self.book_id}\" user=\"{self.user_id}\">"
+
+
+def adjust_active_loans(session, loans: list, delta: int) -> None:
+    """
+    Shift the active_loans counters of the users and books in `loans`, a list of
+    (book_id, user_id) pairs, by `delta` per loan without committing. A book's
+    available_copies move the opposite way.
+    """
+    users, books = User.__table__, Book.__table__
+    session.execute(
+        update(users)
+        .where(users.c.id == bindparam('key'))
+        .values(active_loans=users.c.active_loans + bindparam('amount')),
+        [{'key': key, 'amount': count * delta} for key, count in Counter(user_id for _, user_id in loans).items()],
+    )
+    session.execute(
+        update(books)
+        .where(books.c.id == bindparam('key'))
+        .values(active_loans=books.c.active_loans + bindparam('amount'), available_copies=books.c.available_copies - bindparam('amount')),
+        [{'key': key, 'amount': count * delta} for key, count in Counter(book_id for book_id, _ in loans).items()],
+    )
+
+
+def add_copies(session, counts: dict) -> None:
+    """
+    Add `counts[book_id]` new copies to each book without committing. Barcodes continue
+    the book's numbering as "<book id>-<copy number>".
+    """
+    counts = {book_id: count for book_id, count in counts.items() if count > 0}
+    if not counts:
+        return
+    totals = dict(session.execute(select(Book.id, Book.total_copies).where(Book.id.in_(counts))).all())
+    session.execute(insert(Copy), [
+        {'book_id': book_id, 'barcode': f"{book_id}-{number}", 'status': copyStatuses.AVAILABLE}
+        for book_id, count in counts.items()
+        for number in range(totals[book_id] + 1, totals[book_id] + count + 1)
+    ])
+    books = Book.__table__
+    session.execute(
+        update(books)
+        .where(books.c.id == bindparam('key'))
+        .values(total_copies=books.c.total_copies + bindparam('amount'), available_copies=books.c.available_copies + bindparam('amount')),
+        [{'key': book_id, 'amount': count} for book_id, count in counts.items()],
+    )
+
+
+def checkout_copies(session, book_ids: list, status: str = copyStatuses.ON_LOAN) -> list:
+    """
+    Move one available copy of each book in `book_ids` to `status` without committing,
+    and return the copy ids in the same order. Raises ValueError when a book has no
+    copy left. Counters are left to the caller.
+    """
+    pools = {}
+    for book_id, count in Counter(book_ids).items():
+        pools[book_id] = session.scalars(
+            select(Copy.id)
+            .where(Copy.book_id == book_id, Copy.status == copyStatuses.AVAILABLE)
+            .order_by(Copy.id)
+            .limit(count)
+        ).all()
+        if len(pools[book_id]) < count:
+            raise ValueError(f"Book {book_id} has no copy left to lend")
+    copy_ids = [copy_id for pool in pools.values() for copy_id in pool]
+    checked_out = session.execute(
+        update(Copy)
+        .where(Copy.id.in_(copy_ids), Copy.status == copyStatuses.AVAILABLE)
+        .values(status=status)
+    ).rowcount
+    if checked_out != len(copy_ids):
+        raise ValueError("A copy was lent out concurrently")
+    return [pools[book_id].pop() for book_id in book_ids]
+
+
+def checkin_copies(session, copy_ids: list) -> None:
+    """
+    Mark returned copies as available again without committing.
+    """
+    copy_ids = [copy_id for copy_id in copy_ids if copy_id is not None]
+    if copy_ids:
+        session.execute(update(Copy).where(Copy.id.in_(copy_ids)).values(status=copyStatuses.AVAILABLE))
+
+
+class Notification(Base):
+    """
+    Outbox of messages to users. The scheduler writes them; `scheduler.py drain` hands the
+    undelivered ones to the sink and marks them delivered.
+    """
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        # One notification of each kind per request, so a replayed batch is a no-op
+        Index('uq_notifications_kind_reference', 'kind', 'reference_id', unique=True),
+        Index('ix_notifications_delivered_at', 'delivered_at', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement="auto")
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    # Id of the request the notification is about; no foreign key, the request may be archived
+    reference_id = Column(Integer, nullable=False)
+    message = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    delivered_at = Column(DateTime)
+
+    def __repr__(self) -> str:
+        return f"<Notification id=\"{self.id}\" kind=\"{self.kind}\" user=\"{self.user_id}\">"
+
+
+class ImportCheckpoint(Base):
+    __tablename__ = 'import_checkpoints'
+
+    source = Column(String, primary_key=True, nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self) -> str:
+        return f"<ImportCheckpoint source=\"{self.source}\" position=\"{self.position}\">"
+
+
 if __name__ == '__main__':
     response = input("[WARNING] Do you want to create the database tables? [y] ~> ")
     if response.lower() == 'y':
-        Base.metadata.create_all(databaseConfig.engine)
+        import migrations
+        migrations.upgrade(databaseConfig.engine)
         print('Database created.')
     else:
         print('Canceled.')
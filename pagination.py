@@ -0,0 +1,118 @@
+import json
+import base64
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import operators
+
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: str = None
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.fromisoformat(value['datetime'])
+        return date.fromisoformat(value['date'])
+    return value
+
+
+def encode_cursor(values) -> str:
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        return [_decode_value(value) for value in json.loads(payload)]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _split_order(clause):
+    """
+    Return the column of an ORDER BY clause and whether it sorts descending.
+    """
+    modifier = getattr(clause, 'modifier', None)
+    if modifier in (operators.desc_op, operators.asc_op):
+        return clause.element, modifier is operators.desc_op
+    return clause, False
+
+
+def _after(keys, values):
+    """
+    Build the seek predicate "row comes after `values` in the ordering of `keys`".
+    Expanded into OR-ed prefixes so mixed ASC/DESC orderings work on every backend.
+    """
+    conditions = []
+    for position, (column, descending) in enumerate(keys):
+        equal_prefix = [keys[i][0] == values[i] for i in range(position)]
+        step = column < values[position] if descending else column > values[position]
+        conditions.append(and_(*equal_prefix, step))
+    return or_(*conditions)
+
+
+def paginate(query, order_by: list, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """
+    Fetch one page of `query` using keyset (seek) pagination.
+
+    `order_by` is a list of ORDER BY clauses whose last column must be unique (normally the
+    primary key) so the ordering is stable. Instead of an OFFSET the page starts right after
+    the sort key stored in `cursor`, so every page costs the same as the first one.
+    """
+    keys = [_split_order(clause) for clause in order_by]
+    columns = [column for column, _ in keys]
+
+    query = query.add_columns(*columns)
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError(f"Cursor does not match the ordering: {cursor!r}")
+        query = query.filter(_after(keys, values))
+
+    rows = query.order_by(None).order_by(*order_by).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1][1:])
+    return Page(items=[row[0] for row in rows], next_cursor=next_cursor)
+
+
+
+def paginate_rows(session, statement, order_by: list, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """
+    `paginate` for a Core select of plain columns, e.g. a list that needs no ORM entities.
+    Every column of `order_by` must be selected; the items are the rows themselves.
+    Each page is one query, so nothing stays open between pages.
+    """
+    keys = [_split_order(clause) for clause in order_by]
+
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError(f"Cursor does not match the ordering: {cursor!r}")
+        statement = statement.where(_after(keys, values))
+
+    rows = session.execute(statement.order_by(None).order_by(*order_by).limit(page_size + 1)).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1]._mapping[column] for column, _ in keys])
+    return Page(items=rows, next_cursor=next_cursor)
@@ -0,0 +1,101 @@
+from datetime import date
+from sqlalchemy import select, func, case, cast, or_, Integer
+
+from config import baseConfig
+from models import User, Request, RequestRecord, session_scope
+from cache import ReferenceCache
+
+
+# Overdue days of a user's loans returned before a given day, keyed by (user id, day). Those
+# never change, so the cache needs no invalidation and every process can keep its own.
+SETTLED_LOANS = ReferenceCache(baseConfig.PENALTY_CACHE_SIZE, baseConfig.PENALTY_CACHE_TTL)
+
+
+def days_between(bind, later, earlier):
+    """
+    Whole days from `earlier` to `later` as an integer SQL expression.
+    """
+    if bind.dialect.name == 'sqlite':
+        return cast(func.julianday(later) - func.julianday(earlier), Integer)
+    return later - earlier
+
+
+def overdue_days(bind, model, return_date):
+    """
+    SUM of the days each request of `model` was (or still is) kept past its deadline, never negative per request.
+    """
+    days = days_between(bind, return_date, model.return_deadline)
+    return func.coalesce(func.sum(case((days > 0, days), else_=0)), 0)
+
+
+def settled_overdue_days(session, user_id: int, today: date) -> int:
+    """
+    Overdue days of the user's loans, live or archived, returned before `today`.
+    """
+    def load():
+        return session.execute(
+            select(overdue_days(session.get_bind(), RequestRecord, RequestRecord.return_date))
+            .where(RequestRecord.user_id == user_id, RequestRecord.return_date < today)
+        ).scalar()
+    return SETTLED_LOANS.get((user_id, today), load)
+
+
+def current_overdue_days(session, user_id: int, today: date) -> int:
+    """
+    Overdue days of the user's open loans and of those returned today, which may have been
+    returned by another process after the settled total was cached. The archiver only moves
+    loans returned before today, so these are all in `requests`.
+    """
+    # `today` is bound from Python: SQLite's CURRENT_DATE is UTC and could disagree with date.today()
+    return session.execute(
+        select(overdue_days(session.get_bind(), Request, func.coalesce(Request.return_date, today)))
+        .where(Request.user_id == user_id, or_(Request.return_date.is_(None), Request.return_date >= today))
+    ).scalar()
+
+
+def calculate_penalty(session, user_id: int, today: date = None) -> int:
+    """
+    Penalty owed by a user: overdue days of all their requests times PENALTY_RATE_PER_DAY.
+    Only the open loans and today's returns are aggregated on each call; loans returned
+    before today, live or archived, come from SETTLED_LOANS.
+    """
+    today = today or date.today()
+    return (settled_overdue_days(session, user_id, today) + current_overdue_days(session, user_id, today)) * baseConfig.PENALTY_RATE_PER_DAY
+
+
+def loop_penalty(requests: list, today: date) -> int:
+    """
+    Reference implementation: the per-request Python loop the aggregate replaces.
+    """
+    total_penalty = 0
+    for request in requests:
+        timedelta_diff = (request.return_date or today) - request.return_deadline
+        if timedelta_diff.days > 0:
+            total_penalty += timedelta_diff.days * baseConfig.PENALTY_RATE_PER_DAY
+    return total_penalty
+
+
+def verify() -> list:
+    """
+    Compare calculate_penalty with the Python loop for every user and return the mismatches
+    as (user_id, aggregate, loop) tuples.
+    """
+    today = date.today()
+    mismatches = []
+    with session_scope() as session:
+        for user_id in session.scalars(select(User.id)):
+            requests = session.query(RequestRecord).filter(RequestRecord.user_id == user_id).all()
+            expected = loop_penalty(requests, today)
+            actual = calculate_penalty(session, user_id, today)
+            if actual != expected:
+                mismatches.append((user_id, actual, expected))
+    return mismatches
+
+
+if __name__ == '__main__':
+    mismatches = verify()
+    for user_id, actual, expected in mismatches:
+        print(f"user {user_id}: aggregate {actual}, loop {expected}")
+    print(f"{len(mismatches)} mismatching penalties")
+    if mismatches:
+        raise SystemExit(1)
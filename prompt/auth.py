@@ -6,11 +6,12 @@ from prompt_toolkit.shortcuts import (
 )
 from prompt_toolkit.formatted_text import HTML
 import re
+from sqlalchemy import func
 
-from . import styles
-from models import User
-from utils import check_password
-from config import databaseConfig
+from . import styles, widgets
+from models import User, session_scope
+from utils import submit_check_password, submit_hash_password, password_needs_rehash, PASSWORD_EXECUTOR
+from logger import LOGGER
 
 
 def sign_in() -> User:
@@ -37,8 +38,8 @@ def sign_in() -> User:
             ).run()
             continue
 
-        with databaseConfig.Session() as session:
-            user = session.query(User).filter(User.email == email.lower()).first()
+        with session_scope() as session:
+            user = session.query(User).filter(func.lower(User.email) == email.lower()).first()
 
         if not user:
             message_dialog(
@@ -59,7 +60,10 @@ def sign_in() -> User:
             if password is None:
                 break
 
-            if check_password(password.strip(), user.password):
+            password = password.strip()
+            if widgets.wait_for(submit_check_password(password, user.password), title='Sign In', text='Checking password...', style=styles.BLUE):
+                if password_needs_rehash(user.password):
+                    PASSWORD_EXECUTOR.submit(User.rehash_password, user.id, password).add_done_callback(log_rehash_failure)
                 return user
             else:
                 message_dialog(
@@ -69,6 +73,14 @@ def sign_in() -> User:
                 ).run()
 
 
+def log_rehash_failure(future) -> None:
+    """
+    Done-callback of the background rehash: the sign-in already succeeded, so a failure is only logged.
+    """
+    if future.exception() is not None:
+        LOGGER.error(f"Password rehash failed: {future.exception()}")
+
+
 def sign_up() -> User:
     """
     Prompt the user to sign up by entering their student ID, email address, first name, and last name.
@@ -113,11 +125,14 @@ def sign_up() -> User:
             user_info['last_name'] = get_valid_last_name()
         elif selected_option == 'done':
             if None not in user_info.values():
+                # The default password is the student ID
+                hashed_password = widgets.wait_for(submit_hash_password(str(user_info['student_id'])), title='Sign Up', text='Creating account...', style=styles.BLUE)
                 return User.create(
                     id=user_info['student_id'],
                     email=user_info['email'],
                     first_name=user_info['first_name'],
                     last_name=user_info['last_name'],
+                    hashed_password=hashed_password,
                 )
             else:
                 should_edit = yes_no_dialog(
@@ -150,15 +165,16 @@ def get_valid_student_id() -> int:
         if not student_id:
             return None
         elif re.match(student_id_pattern, student_id):
-            with databaseConfig.Session() as session:
-                if session.query(User).filter(User.id == student_id).count() == 0:
-                    return int(student_id)
-                else:
-                    message_dialog(
-                        title='Sign Up | Error',
-                        text='User with that student identification number already exists.\nPlease try again.',
-                        style=styles.ERROR
-                    ).run()
+            with session_scope() as session:
+                student_id_taken = session.query(User).filter(User.id == student_id).count() > 0
+            if not student_id_taken:
+                return int(student_id)
+            else:
+                message_dialog(
+                    title='Sign Up | Error',
+                    text='User with that student identification number already exists.\nPlease try again.',
+                    style=styles.ERROR
+                ).run()
         else:
             message_dialog(
                 title='Sign Up | Error',
@@ -183,15 +199,16 @@ def get_valid_email() -> str:
         if not email or email.strip() == '':
             return None
         elif re.match(email_pattern, email):
-            with databaseConfig.Session() as session:
-                if session.query(User).filter(User.email == email).count() == 0:
-                    return email
-                else:
-                    message_dialog(
-                        title='Sign Up | Error',
-                        text='Email address already exists.\nPlease try again.',
-                        style=styles.ERROR
-                    ).run()
+            with session_scope() as session:
+                email_taken = session.query(User).filter(User.email == email).count() > 0
+            if not email_taken:
+                return email
+            else:
+                message_dialog(
+                    title='Sign Up | Error',
+                    text='Email address already exists.\nPlease try again.',
+                    style=styles.ERROR
+                ).run()
         else:
             message_dialog(
                 title='Sign Up | Error',
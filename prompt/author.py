@@ -7,29 +7,51 @@ from prompt_toolkit.shortcuts import (
 from prompt_toolkit.formatted_text import HTML
 import re
 
-from . import styles
-from config import databaseConfig
-from models import Author
+from . import styles, widgets
+from models import Author, session_scope
+from search import trigram, prefix
+from pagination import paginate, Page
 
 
 def search_authors():
     while True:
-        author_name = input_dialog(
+        result = widgets.incremental_search_dialog(
             title="Search Authors",
             text="Enter a author name:",
+            search=lambda query: prefix.suggest('authors', query),
         ).run()
 
-        if not author_name:
+        if not result:
             return None
 
-        with databaseConfig.Session() as session:
-            authors = session.query(Author).filter((Author.first_name + ' ' + Author.last_name).ilike(f'%{author_name}%')).all()
+        if result.value is not None:
+            with session_scope() as session:
+                return session.query(Author).filter(Author.id == result.value).first()
+
+        author_name = result.query
+        if not author_name:
+            return None
 
-        if authors:
-            selected_author = radiolist_dialog(
+        def fetch_page(cursor):
+            with session_scope() as session:
+                query = session.query(Author).filter((Author.first_name + ' ' + Author.last_name).ilike(f'%{author_name}%'))
+                return paginate(query, [Author.id], cursor)
+
+        page = fetch_page(None)
+        if not page.items:
+            with session_scope() as session:
+                author_ids = trigram.search(session, 'authors', author_name)
+                authors = session.query(Author).filter(Author.id.in_(author_ids)).all()
+                authors.sort(key=lambda author: author_ids.index(author.id))
+            page = Page(items=authors)
+
+        if page.items:
+            selected_author = widgets.lazy_list_dialog(
                 title="Search Authors",
                 text="Select a author:",
-                values=[(author, f"{author.first_name} {author.last_name}") for author in authors],
+                page=page,
+                fetch_page=fetch_page,
+                label=lambda author: f"{author.first_name} {author.last_name}",
             ).run()
             if selected_author:
                 return selected_author
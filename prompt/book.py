@@ -9,37 +9,54 @@ from prompt_toolkit.shortcuts import (
 from prompt_toolkit.formatted_text import HTML
 from sqlalchemy.orm import joinedload
 
-from . import styles, author, publisher
-from config import baseConfig, databaseConfig
-from models import User, Book, Author, Publisher, Request
+from . import styles, author, publisher, widgets
+from config import baseConfig, holdStatuses
+from models import User, Book, Author, Publisher, Request, Hold, session_scope
+import reservations
+import holds
 from utils import check_isbn
+from search import catalog, prefix
+from pagination import paginate, Page
+
+
+COUNTER_FIELDS = ['active_loans', 'total_copies', 'available_copies']
 
 
 def search_books() -> Book:
     while True:
-        search_input = input_dialog(
+        result = widgets.incremental_search_dialog(
             title="Search Books",
             text="Enter book name or author name or ISBN:",
+            search=lambda query: prefix.suggest('books', query),
         ).run()
 
+        if not result:
+            return None
+
+        if result.value is not None:
+            with session_scope() as session:
+                return session.query(Book).options(joinedload(Book.author), joinedload(Book.publisher)).filter(Book.id == result.value).first()
+
+        search_input = result.query
         if not search_input:
             return None
 
-        with databaseConfig.Session() as session:
-            is_valid_isbn, isbn = check_isbn(search_input)
-            if is_valid_isbn:
-                books = session.query(Book).options(joinedload(Book.author)).filter(Book.isbn == isbn).all()
-            else:
-                books = session.query(Book).options(joinedload(Book.author)).filter(Book.book_name.ilike(f'%{search_input}%')).all()
-                authors = session.query(Author).filter((Author.first_name + ' ' + Author.last_name).ilike(f'%{search_input}%')).all()
-                for author in authors:
-                    books = session.query(Book).options(joinedload(Book.author)).filter(Book.author == author).all()
+        def fetch_page(cursor):
+            with session_scope() as session:
+                return catalog.search(session, search_input, cursor)
+
+        page = fetch_page(None)
+        if not page.items:
+            with session_scope() as session:
+                page = Page(items=catalog.fuzzy_search(session, search_input))
 
-        if books:
-            selected_book = radiolist_dialog(
+        if page.items:
+            selected_book = widgets.lazy_list_dialog(
                 title="Search Books",
                 text="Select a book:",
-                values=[(book, f"{book.book_name}, {book.author.first_name} {book.author.last_name}") for book in books],
+                page=page,
+                fetch_page=fetch_page,
+                label=lambda book: f"{book.book_name}, {book.author.first_name} {book.author.last_name} ({book.available_copies}/{book.total_copies} available)",
             ).run()
             if selected_book:
                 return selected_book
@@ -65,6 +82,7 @@ def add_book() -> Book:
         'publisher': None,
         'publish_year': None,
         'volume': None,
+        'copies': None,
     }
 
     while True:
@@ -128,6 +146,8 @@ def add_book() -> Book:
             book_info['publish_year'] = get_valid_publish_year()
         elif selected_option == 'volume':
             book_info['volume'] = get_valid_volume()
+        elif selected_option == 'copies':
+            book_info['copies'] = get_valid_copies()
         elif selected_option == 'done':
             if None not in [book_info[field_name] for field_name in ['book_name', 'isbn', 'author', 'publisher']]:
                 return Book.create(
@@ -137,6 +157,7 @@ def add_book() -> Book:
                     publisher=book_info['publisher'],
                     publish_year=book_info['publish_year'],
                     volume=book_info['volume'],
+                    copies=book_info['copies'] or 1,
                 )
             else:
                 should_edit = yes_no_dialog(
@@ -154,7 +175,8 @@ def add_book() -> Book:
 
 
 def update_book(book: Book) -> Book:
-    book_info = book.as_dict()
+    # Loan and copy counters are maintained by reservations and holdings, never edited by hand
+    book_info = {field_name: field_value for field_name, field_value in book.as_dict().items() if field_name not in COUNTER_FIELDS}
 
     while True:
         values = []
@@ -248,8 +270,9 @@ def delete_book(book: Book) -> bool:
 
 
 def reserve_book(user_id: int) -> Request:
-    with databaseConfig.Session() as session:
-        current_user_reservations = session.query(Request).filter(Request.return_date == None).filter(Request.user_id == user_id).count()
+    with session_scope() as session:
+        holds.expire(session)
+        current_user_reservations = session.query(User.active_loans).filter(User.id == user_id).scalar()
 
     if current_user_reservations >= baseConfig.MAX_RESERVATIONS_LIMIT:
         message_dialog(
@@ -261,24 +284,25 @@ def reserve_book(user_id: int) -> Request:
 
     selected_book = search_books()
     if selected_book:
-        with databaseConfig.Session() as session:
-            is_reserved = selected_book.is_reserved()
-            if is_reserved:
-                message_dialog(
-                    title="Reserve Book",
-                    text="The selected book is already reserved.",
-                    style=styles.ERROR,
-                ).run()
-                return
+        try:
+            with session_scope() as session:
+                request = reservations.reserve(session, selected_book.id, user_id)
+        except reservations.ReservationError as e:
+            if e.reason == reservations.ReservationError.UNAVAILABLE:
+                return place_hold(selected_book, user_id)
+            message_dialog(
+                title="Reserve Book",
+                text=str(e),
+                style=styles.ERROR,
+            ).run()
+            return
 
-            request = Request.create(book=selected_book, user=User.get_by_id(user_id))
-            if request:
-                message_dialog(
-                    title="Reserve Book",
-                    text="Book reserved successfully.",
-                    style=styles.SUCCESS,
-                ).run()
-                return request
+        message_dialog(
+            title="Reserve Book",
+            text="Book reserved successfully.",
+            style=styles.SUCCESS,
+        ).run()
+        return request
     else:
         message_dialog(
             title="Reserve Book",
@@ -287,8 +311,91 @@ def reserve_book(user_id: int) -> Request:
         ).run()
 
 
+def place_hold(selected_book: Book, user_id: int) -> None:
+    join_queue = yes_no_dialog(
+        title="Reserve Book",
+        text=f"No copy of '{selected_book.book_name}' is available. Would you like to join the queue for it?",
+        style=styles.BLUE,
+    ).run()
+    if not join_queue:
+        return
+
+    try:
+        with session_scope() as session:
+            hold = holds.place(session, selected_book.id, user_id)
+            text = (
+                f"A copy is set aside for you until {hold.expires_at:%Y-%m-%d}; reserve the book again to borrow it."
+                if hold.status == holdStatuses.READY
+                else f"You are number {holds.position(session, hold)} in the queue."
+            )
+    except holds.HoldError as e:
+        message_dialog(
+            title="Reserve Book",
+            text=str(e),
+            style=styles.ERROR,
+        ).run()
+        return
+
+    message_dialog(
+        title="Reserve Book",
+        text=text,
+        style=styles.SUCCESS,
+    ).run()
+
+
+def show_holds(user_id):
+    def fetch_page(cursor):
+        with session_scope() as session:
+            query = (
+                session.query(Hold)
+                .filter(Hold.user_id == user_id)
+                .filter(Hold.status.in_([holdStatuses.WAITING, holdStatuses.READY]))
+                .options(joinedload(Hold.book))
+            )
+            return paginate(query, [Hold.id], cursor)
+
+    def label(hold):
+        book_name = hold.book.book_name if hold.book else "Unknown Book"
+        if hold.status == holdStatuses.READY:
+            return f"{book_name}, ready until {hold.expires_at:%Y-%m-%d}"
+        return f"{book_name}, waiting since {hold.placed_at:%Y-%m-%d}"
+
+    with session_scope() as session:
+        holds.expire(session)
+
+    page = fetch_page(None)
+    if not page.items:
+        message_dialog(
+            title="Holds",
+            text="You have no holds.",
+            style=styles.ERROR,
+        ).run()
+        return
+
+    selected_hold = widgets.lazy_list_dialog(
+        title="Holds",
+        text="Select a hold to cancel:",
+        page=page,
+        fetch_page=fetch_page,
+        label=label,
+        style=styles.BLUE,
+    ).run()
+
+    if not selected_hold:
+        return
+
+    confirmation = yes_no_dialog(
+        title="Cancel Hold",
+        text="Are you sure you want to leave the queue?",
+        style=styles.BLUE,
+    ).run()
+    if confirmation:
+        with session_scope() as session:
+            holds.cancel(session, selected_hold.id, user_id)
+
+
 def return_book(request_id):
-    with databaseConfig.Session() as session:
+    with session_scope() as session:
         request = (
             session.query(Request)
             .filter(Request.id == request_id)
@@ -306,7 +413,16 @@ def return_book(request_id):
     if not confirmation:
         return
 
-    request.update(return_date=date.today())
+    with session_scope() as session:
+        returned = reservations.release(session, request.id)
+
+    if not returned:
+        message_dialog(
+            title="Return Book",
+            text="This book has already been returned.",
+            style=styles.ERROR,
+        ).run()
+        return
 
     message_dialog(
         title="Return Book",
@@ -316,16 +432,18 @@ def return_book(request_id):
 
 
 def show_reserved_books(user_id):
-    with databaseConfig.Session() as session:
-        unreturned_books = (
-            session.query(Request)
-            .filter(Request.user_id == user_id)
-            .filter(Request.return_date == None)
-            .options(joinedload(Request.book))
-            .all()
-        )
-
-    if not unreturned_books:
+    def fetch_page(cursor):
+        with session_scope() as session:
+            query = (
+                session.query(Request)
+                .filter(Request.user_id == user_id)
+                .filter(Request.return_date == None)
+                .options(joinedload(Request.book))
+            )
+            return paginate(query, [Request.id], cursor)
+
+    page = fetch_page(None)
+    if not page.items:
         message_dialog(
             title="Reserved Books",
             text="You have no reserved books.",
@@ -333,17 +451,19 @@ def show_reserved_books(user_id):
         ).run()
         return
 
-    selected_book = radiolist_dialog(
+    selected_request = widgets.lazy_list_dialog(
         title="Reserved Books",
         text="Select a book to return:",
-        values=[(str(request.id), request.book.book_name) for request in unreturned_books if request.book],
+        page=page,
+        fetch_page=fetch_page,
+        label=lambda request: request.book.book_name if request.book else "Unknown Book",
         style=styles.BLUE,
     ).run()
 
-    if not selected_book:
+    if not selected_request:
         return
 
-    return return_book(int(selected_book))
+    return return_book(selected_request.id)
 
 
 def get_valid_book_name():
@@ -434,3 +554,25 @@ def get_valid_volume():
                 text='Please enter a valid number.',
                 style=styles.ERROR
             ).run()
+
+
+def get_valid_copies(title: str = 'Add Book'):
+    """
+    Prompt the user to enter a number of copies, or nothing for one copy.
+    """
+    while True:
+        copies = input_dialog(
+            title=title,
+            text='Please enter number of copies:',
+            style=styles.BLUE,
+        ).run()
+        if not copies or copies.strip() == '':
+            return None
+        elif copies.strip().isdigit() and int(copies) > 0:
+            return int(copies)
+        else:
+            message_dialog(
+                title=f'{title} | Error',
+                text='Please enter a valid number.',
+                style=styles.ERROR
+            ).run()
@@ -1,10 +1,9 @@
 from prompt_toolkit.shortcuts import radiolist_dialog, button_dialog, message_dialog
 from prompt_toolkit.formatted_text import HTML
-from sqlalchemy.orm import joinedload
 
-from . import styles, book, student
-from models import User, Author, Publisher, Request
-from config import databaseConfig
+from . import styles, book, student, request_browser
+from models import User, Author, Publisher
+import holds
 
 
 def manager_menu(manager_id):
@@ -52,6 +51,7 @@ def manager_menu(manager_id):
                     text=HTML(text),
                     buttons=[
                         ('Update', 'update_book'),
+                        ('Copies', 'add_copies'),
                         ('Delete', 'delete_book'),
                         ('Back', None)
                     ],
@@ -63,6 +63,10 @@ def manager_menu(manager_id):
                         selected_book = updated_book
                     else:
                         break
+                elif search_book_selected_option == 'add_copies':
+                    copies = book.get_valid_copies('Add Copies')
+                    if copies:
+                        holds.receive_copies(selected_book, copies)
                 elif search_book_selected_option == 'delete_book':
                     if book.delete_book(selected_book):
                         break
@@ -116,28 +120,9 @@ def manager_menu(manager_id):
                 else:
                     break
         elif selected_option=="show_all_requests":
-            with databaseConfig.Session() as session:
-                requests = (
-                    session.query(Request)
-                    .options(joinedload(Request.book))
-                    .options(joinedload(Request.user))
-                    .all()
-                )
-            if not requests:
-                message_dialog(
-                    title="User Requests",
-                    text="No requests found.",
-                    style=styles.BLUE,
-                ).run()
-                continue
-
-            request_info = "\n".join([f"User: {str(request.user)}, Book: {request.book.book_name if request.book else 'Unknown Book'}, Delivery Date: {request.delivery_date}, Return Date: {request.return_date if request.return_date else 'Not returned'}" for request in requests])
-            message_dialog(
-                title="User Requests",
-                text=request_info,
-                style=styles.BLUE,
-            ).run()
+            request_browser.browse_requests()
         elif selected_option=="change_password":
             student.change_password(manager_id, manager_id)
         elif selected_option==None:
             break
+
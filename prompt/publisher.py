@@ -6,29 +6,51 @@ from prompt_toolkit.shortcuts import (
 )
 from prompt_toolkit.formatted_text import HTML
 
-from . import styles
-from config import databaseConfig
-from models import Publisher
+from . import styles, widgets
+from models import Publisher, session_scope
+from search import trigram, prefix
+from pagination import paginate, Page
 
 
 def search_publishers():
     while True:
-        publisher_name = input_dialog(
+        result = widgets.incremental_search_dialog(
             title="Search Publishers",
             text="Enter a publisher name:",
+            search=lambda query: prefix.suggest('publishers', query),
         ).run()
 
-        if not publisher_name:
+        if not result:
             return None
 
-        with databaseConfig.Session() as session:
-            publishers = session.query(Publisher).filter(Publisher.publisher_name.ilike(f'%{publisher_name}%')).all()
+        if result.value is not None:
+            with session_scope() as session:
+                return session.query(Publisher).filter(Publisher.id == result.value).first()
+
+        publisher_name = result.query
+        if not publisher_name:
+            return None
 
-        if publishers:
-            selected_publisher = radiolist_dialog(
+        def fetch_page(cursor):
+            with session_scope() as session:
+                query = session.query(Publisher).filter(Publisher.publisher_name.ilike(f'%{publisher_name}%'))
+                return paginate(query, [Publisher.id], cursor)
+
+        page = fetch_page(None)
+        if not page.items:
+            with session_scope() as session:
+                publisher_ids = trigram.search(session, 'publishers', publisher_name)
+                publishers = session.query(Publisher).filter(Publisher.id.in_(publisher_ids)).all()
+                publishers.sort(key=lambda publisher: publisher_ids.index(publisher.id))
+            page = Page(items=publishers)
+
+        if page.items:
+            selected_publisher = widgets.lazy_list_dialog(
                 title="Search Publishers",
                 text="Select a publisher:",
-                values=[(publisher, f"{publisher.publisher_name}, {publisher.city}") for publisher in publishers],
+                page=page,
+                fetch_page=fetch_page,
+                label=lambda publisher: f"{publisher.publisher_name}, {publisher.city}",
             ).run()
             if selected_publisher:
                 return selected_publisher
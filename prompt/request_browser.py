@@ -0,0 +1,144 @@
+from datetime import date
+from prompt_toolkit.shortcuts import message_dialog, radiolist_dialog, input_dialog
+from prompt_toolkit.formatted_text import HTML
+from sqlalchemy import select
+
+from . import styles, book, student, widgets
+from models import User, Book, RequestRecord, session_scope
+from pagination import paginate_rows
+
+
+STATUSES = [
+    ('all', 'All'),
+    ('open', 'Open'),
+    ('overdue', 'Overdue'),
+    ('returned', 'Returned'),
+]
+
+
+def requests_statement(filters: dict, today: date = None):
+    """
+    Select only the columns the browser displays, narrowed by the chosen filters.
+    """
+    today = today or date.today()
+    statement = (
+        select(RequestRecord.id, RequestRecord.delivery_date, RequestRecord.return_date, User.first_name, User.last_name, Book.book_name)
+        .join(User, User.id == RequestRecord.user_id)
+        .outerjoin(Book, Book.id == RequestRecord.book_id)
+        .order_by(RequestRecord.id)
+    )
+    if filters['status'] == 'open':
+        statement = statement.where(RequestRecord.return_date.is_(None))
+    elif filters['status'] == 'overdue':
+        statement = statement.where(RequestRecord.return_date.is_(None), RequestRecord.return_deadline < today)
+    elif filters['status'] == 'returned':
+        statement = statement.where(RequestRecord.return_date.is_not(None))
+    if filters['user'] is not None:
+        statement = statement.where(RequestRecord.user_id == filters['user'].id)
+    if filters['book'] is not None:
+        statement = statement.where(RequestRecord.book_id == filters['book'].id)
+    if filters['delivered_from'] is not None:
+        statement = statement.where(RequestRecord.delivery_date >= filters['delivered_from'])
+    if filters['delivered_to'] is not None:
+        statement = statement.where(RequestRecord.delivery_date <= filters['delivered_to'])
+    return statement
+
+
+def browse_requests():
+    filters = {
+        'status': 'all',
+        'user': None,
+        'book': None,
+        'delivered_from': None,
+        'delivered_to': None,
+    }
+
+    while True:
+        def describe(field_name):
+            value = filters[field_name]
+            if field_name == 'status':
+                return dict(STATUSES)[value]
+            return str(value) if value is not None else 'Any'
+
+        values = [(field_name, HTML('<style fg="#5DA7DB"><b>' + field_name.replace('_', ' ').title().ljust(len(max(filters.keys(), key=len))) + '</b></style> <style fg="#5DA7DB"><i>' + describe(field_name) + '</i></style>')) for field_name in filters]
+        values.append(('show', HTML('<style fg="#5DA7DB"><b>Show Requests</b></style>')))
+
+        selected_option = radiolist_dialog(
+            title='User Requests',
+            text='Filter the requests:',
+            values=values,
+            default='show',
+            cancel_text='Back',
+            style=styles.BLUE,
+        ).run()
+
+        if selected_option == 'status':
+            filters['status'] = radiolist_dialog(
+                title='User Requests',
+                text='Select a status:',
+                values=STATUSES,
+                default=filters['status'],
+                style=styles.BLUE,
+            ).run() or filters['status']
+        elif selected_option == 'user':
+            filters['user'] = student.search_student_by_id()
+        elif selected_option == 'book':
+            filters['book'] = book.search_books()
+        elif selected_option == 'delivered_from':
+            filters['delivered_from'] = get_valid_date('Delivered from (YYYY-MM-DD), empty for any:')
+        elif selected_option == 'delivered_to':
+            filters['delivered_to'] = get_valid_date('Delivered to (YYYY-MM-DD), empty for any:')
+        elif selected_option == 'show':
+            show_requests(filters)
+        else:
+            return
+
+
+def show_requests(filters: dict):
+    statement = requests_statement(filters)
+
+    def fetch_page(cursor):
+        with session_scope() as session:
+            return paginate_rows(session, statement, [RequestRecord.id], cursor)
+
+    page = fetch_page(None)
+    if not page.items:
+        message_dialog(
+            title="User Requests",
+            text="No requests found.",
+            style=styles.BLUE,
+        ).run()
+        return
+
+    widgets.lazy_list_dialog(
+        title="User Requests",
+        text="",
+        page=page,
+        fetch_page=fetch_page,
+        label=lambda row: f"User: {row.first_name} {row.last_name}, Book: {row.book_name or 'Unknown Book'}, Delivery Date: {row.delivery_date}, Return Date: {row.return_date if row.return_date else 'Not returned'}",
+        style=styles.BLUE,
+        ok_text="Close",
+        selectable=False,
+    ).run()
+
+
+def get_valid_date(text: str) -> date:
+    """
+    Prompt the user to enter a date, or nothing for no bound.
+    """
+    while True:
+        value = input_dialog(
+            title='User Requests',
+            text=text,
+            style=styles.BLUE,
+        ).run()
+        if not value or value.strip() == '':
+            return None
+        try:
+            return date.fromisoformat(value.strip())
+        except ValueError:
+            message_dialog(
+                title='User Requests | Error',
+                text='Please enter a valid date.',
+                style=styles.ERROR
+            ).run()
@@ -1,4 +1,3 @@
-from datetime import date
 from prompt_toolkit.shortcuts import (
     message_dialog,
     radiolist_dialog,
@@ -8,10 +7,12 @@ from prompt_toolkit.shortcuts import (
 from sqlalchemy.orm import joinedload
 import re
 
-from . import styles, book
-from models import User, Request
-from config import baseConfig, databaseConfig, userRoles
-from utils import check_password
+from . import styles, book, widgets
+from models import User, RequestRecord, session_scope
+from config import userRoles
+from utils import submit_check_password, submit_hash_password
+from pagination import paginate
+import penalties
 
 
 def student_menu(user_id):
@@ -22,6 +23,7 @@ def student_menu(user_id):
             values=[
                 ("reserve_book", "Reserve Book"),
                 ("show_reserved_books", "Show Reserved Book"),
+                ("show_holds", "Show Holds"),
                 ("show_penalty", "Show Penalty"),
                 ("show_requests", "Show Requests"),
                 ("change_password", "Change Password"),
@@ -35,6 +37,8 @@ def student_menu(user_id):
             book.reserve_book(user_id)
         elif selected_option == 'show_reserved_books':
             book.show_reserved_books(user_id)
+        elif selected_option == 'show_holds':
+            book.show_holds(user_id)
         elif selected_option == 'show_penalty':
             penalty = calculate_penalty(user_id)
             message_dialog(
@@ -63,7 +67,7 @@ def change_password(user_id: int, updated_by_user_id: int, get_old_password: boo
         ).run()
         if not old_password:
             return None
-        elif check_password(old_password, user.password):
+        elif widgets.wait_for(submit_check_password(old_password, user.password), title='Change Password', text='Checking password...', style=styles.PINK):
             get_old_password = False
         else:
             message_dialog(
@@ -95,7 +99,8 @@ def change_password(user_id: int, updated_by_user_id: int, get_old_password: boo
                 if not new_password_again:
                     break
                 elif new_password==new_password_again:
-                    user.update_password(new_password, updated_by_user_id)
+                    hashed_password = widgets.wait_for(submit_hash_password(new_password), title='Change Password', text='Saving password...', style=styles.PINK)
+                    user.update_password(hashed_password, updated_by_user_id)
                     message_dialog(
                         title='Change Password',
                         text='Your password successfully changed.',
@@ -126,56 +131,43 @@ def search_student_by_id() -> User:
         if not user_id:
             return None
 
-        with databaseConfig.Session() as session:
+        with session_scope() as session:
             user = session.query(User).filter(User.role == userRoles.STUDENT).filter(User.id == user_id).first()
 
-            if user:
-                confirmation = yes_no_dialog(
-                    title="Search Student",
-                    text=f"Student found: {str(user)}. Do you want to proceed?",
-                    style=styles.WARNING,
-                ).run()
+        if user:
+            confirmation = yes_no_dialog(
+                title="Search Student",
+                text=f"Student found: {str(user)}. Do you want to proceed?",
+                style=styles.WARNING,
+            ).run()
 
-                if confirmation:
-                    return user
-            else:
-                message_dialog(
-                    title="Search Student",
-                    text="Student not found.",
-                    style=styles.ERROR,
-                ).run()
+            if confirmation:
+                return user
+        else:
+            message_dialog(
+                title="Search Student",
+                text="Student not found.",
+                style=styles.ERROR,
+            ).run()
 
 
 def calculate_penalty(user_id):
-    with databaseConfig.Session() as session:
-        requests = (
-            session.query(Request)
-            .filter(Request.user_id == user_id)
-            .all()
-        )
-
-    total_penalty = 0
-    for request in requests:
-        return_date = request.return_date or date.today()
-        return_deadline = request.return_deadline
-        timedelta_diff = return_date - return_deadline
-
-        if timedelta_diff.days > 0:
-            penalty = timedelta_diff.days * baseConfig.PENALTY_RATE_PER_DAY
-            total_penalty += penalty
-
-    return total_penalty
+    with session_scope() as session:
+        return penalties.calculate_penalty(session, user_id)
 
 
 def show_student_requests(user_id):
-    with databaseConfig.Session() as session:
-        requests = (
-            session.query(Request)
-            .filter(Request.user_id == user_id)
-            .options(joinedload(Request.book))
-            .all()
-        )
-    if not requests:
+    def fetch_page(cursor):
+        with session_scope() as session:
+            query = (
+                session.query(RequestRecord)
+                .filter(RequestRecord.user_id == user_id)
+                .options(joinedload(RequestRecord.book))
+            )
+            return paginate(query, [RequestRecord.id], cursor)
+
+    page = fetch_page(None)
+    if not page.items:
         message_dialog(
             title="User Requests | Error",
             text="No requests found for the user.",
@@ -183,9 +175,13 @@ def show_student_requests(user_id):
         ).run()
         return
 
-    request_info = "\n".join([f"Book: {request.book.book_name if request.book else 'Unknown Book'}, Delivery Date: {request.delivery_date}, Return Date: {request.return_date if request.return_date else 'Not returned'}" for request in requests])
-    message_dialog(
+    widgets.lazy_list_dialog(
         title="User Requests",
-        text=request_info,
+        text="",
+        page=page,
+        fetch_page=fetch_page,
+        label=lambda request: f"Book: {request.book.book_name if request.book else 'Unknown Book'}, Delivery Date: {request.delivery_date}, Return Date: {request.return_date if request.return_date else 'Not returned'}",
         style=styles.BLUE,
+        ok_text="Close",
+        selectable=False,
     ).run()
@@ -0,0 +1,269 @@
+import asyncio
+from typing import NamedTuple
+
+from prompt_toolkit.application import Application
+from prompt_toolkit.application.current import get_app
+from prompt_toolkit.data_structures import Point
+from prompt_toolkit.filters import has_focus
+from prompt_toolkit.formatted_text import to_formatted_text
+from prompt_toolkit.key_binding import KeyBindings, merge_key_bindings
+from prompt_toolkit.key_binding.bindings.focus import focus_next, focus_previous
+from prompt_toolkit.key_binding.defaults import load_key_bindings
+from prompt_toolkit.layout import HSplit, Layout, Window
+from prompt_toolkit.layout.controls import UIControl, UIContent
+from prompt_toolkit.mouse_events import MouseEventType
+from prompt_toolkit.widgets import Button, Dialog, Label, TextArea
+
+from pagination import Page
+
+
+class LazyListControl(UIControl):
+    """
+    A selectable list that only renders the rows currently on screen and pulls
+    the next page from `fetch_page(cursor)` when the selection gets close to the
+    last loaded row, so opening it costs one page whatever the size of the result.
+    """
+
+    def __init__(self, page, fetch_page, label, on_accept=None):
+        self.items = list(page.items)
+        self.next_cursor = page.next_cursor
+        self.fetch_page = fetch_page
+        self.label = label
+        self.on_accept = on_accept
+        self.selected_index = 0
+        self.visible_height = 20
+        self._labels = {}
+
+    def set_page(self, page) -> None:
+        self.items = list(page.items)
+        self.next_cursor = page.next_cursor
+        self.selected_index = 0
+        self._labels = {}
+
+    @property
+    def selected_item(self):
+        return self.items[self.selected_index] if self.items else None
+
+    def load_more(self) -> None:
+        if self.next_cursor is None:
+            return
+        page = self.fetch_page(self.next_cursor)
+        self.items.extend(page.items)
+        self.next_cursor = page.next_cursor
+
+    def select(self, index: int) -> None:
+        # Keep a screen's worth of rows loaded below the selection
+        while self.next_cursor is not None and index + self.visible_height >= len(self.items):
+            self.load_more()
+        self.selected_index = max(0, min(index, len(self.items) - 1))
+
+    def is_focusable(self) -> bool:
+        return bool(self.items)
+
+    def preferred_height(self, width, max_available_height, wrap_lines, get_line_prefix):
+        return min(self.line_count(), max_available_height)
+
+    def line_count(self) -> int:
+        return len(self.items) + (1 if self.next_cursor is not None else 0)
+
+    def _render(self, index: int):
+        if index >= len(self.items):
+            return [('class:radio-list italic', ' More results...')]
+        if index not in self._labels:
+            self._labels[index] = to_formatted_text(self.label(self.items[index]))
+        fragments = self._labels[index]
+        if index == self.selected_index:
+            return [('[SetCursorPosition]', ''), ('class:radio-list reverse', '> ')] + [(f'{style} reverse', text) for style, text in fragments]
+        return [('class:radio-list', '  ')] + fragments
+
+    def create_content(self, width: int, height: int) -> UIContent:
+        self.visible_height = height
+        return UIContent(
+            get_line=self._render,
+            line_count=self.line_count(),
+            cursor_position=Point(x=0, y=self.selected_index),
+            show_cursor=False,
+        )
+
+    def mouse_handler(self, mouse_event):
+        if mouse_event.event_type == MouseEventType.SCROLL_DOWN:
+            self.select(self.selected_index + 1)
+        elif mouse_event.event_type == MouseEventType.SCROLL_UP:
+            self.select(self.selected_index - 1)
+        elif mouse_event.event_type == MouseEventType.MOUSE_UP:
+            if mouse_event.position.y < len(self.items):
+                self.select(mouse_event.position.y)
+            else:
+                self.select(len(self.items))
+        else:
+            return NotImplemented
+        return None
+
+    def get_key_bindings(self):
+        bindings = KeyBindings()
+
+        @bindings.add('up')
+        def _up(event) -> None:
+            self.select(self.selected_index - 1)
+
+        @bindings.add('down')
+        def _down(event) -> None:
+            self.select(self.selected_index + 1)
+
+        @bindings.add('pageup')
+        def _page_up(event) -> None:
+            self.select(self.selected_index - self.visible_height)
+
+        @bindings.add('pagedown')
+        def _page_down(event) -> None:
+            self.select(self.selected_index + self.visible_height)
+
+        @bindings.add('home')
+        def _home(event) -> None:
+            self.select(0)
+
+        @bindings.add('enter')
+        def _enter(event) -> None:
+            if self.on_accept:
+                self.on_accept()
+
+        return bindings
+
+
+def lazy_list_dialog(title='', text='', page=None, fetch_page=None, label=str, ok_text='Ok', cancel_text='Cancel', selectable=True, style=None) -> Application:
+    """
+    Display a paginated result list, starting with the already fetched `page`.
+    With `selectable` the application returns the chosen item, otherwise it only
+    lets the user browse and returns None.
+    """
+    def ok_handler() -> None:
+        get_app().exit(result=control.selected_item if selectable else None)
+
+    def cancel_handler() -> None:
+        get_app().exit()
+
+    control = LazyListControl(page, fetch_page, label, on_accept=ok_handler)
+
+    buttons = [Button(text=ok_text, handler=ok_handler)]
+    if selectable:
+        buttons.append(Button(text=cancel_text, handler=cancel_handler))
+
+    dialog = Dialog(
+        title=title,
+        body=HSplit(
+            [Label(text=text, dont_extend_height=True), Window(content=control, wrap_lines=False)],
+            padding=1,
+        ),
+        buttons=buttons,
+        with_background=True,
+    )
+
+    bindings = KeyBindings()
+    bindings.add('tab')(focus_next)
+    bindings.add('s-tab')(focus_previous)
+
+    return Application(
+        layout=Layout(dialog, focused_element=control),
+        key_bindings=merge_key_bindings([load_key_bindings(), bindings]),
+        mouse_support=True,
+        style=style,
+        full_screen=True,
+    )
+
+
+class SearchResult(NamedTuple):
+    value: object
+    query: str
+
+
+def incremental_search_dialog(title='', text='', search=None, label=str, debounce=0.04, ok_text='Ok', cancel_text='Cancel', style=None) -> Application:
+    """
+    Display a search box whose candidate list is refreshed as the user types.
+
+    `search(query)` returns a list of (value, label) pairs; it runs in a worker thread once
+    typing pauses for `debounce` seconds, and results of a query that was superseded by a
+    newer keystroke are dropped. The application returns a `SearchResult` with the chosen
+    value, or with value None when the user submits the typed query instead.
+    """
+    state = {'task': None, 'generation': 0}
+
+    def ok_handler() -> None:
+        if get_app().layout.has_focus(control) and control.selected_item is not None:
+            get_app().exit(result=SearchResult(control.selected_item[0], search_box.text))
+        else:
+            get_app().exit(result=SearchResult(None, search_box.text))
+
+    def cancel_handler() -> None:
+        get_app().exit()
+
+    def submit_handler(buffer) -> bool:
+        get_app().exit(result=SearchResult(None, buffer.text))
+        return True
+
+    async def refresh(query: str, generation: int) -> None:
+        await asyncio.sleep(debounce)
+        candidates = await asyncio.get_running_loop().run_in_executor(None, search, query) if query.strip() else []
+        if generation == state['generation']:
+            control.set_page(Page(items=candidates))
+            get_app().invalidate()
+
+    def on_text_changed(buffer) -> None:
+        state['generation'] += 1
+        if state['task'] is not None:
+            state['task'].cancel()
+        state['task'] = get_app().create_background_task(refresh(buffer.text, state['generation']))
+
+    control = LazyListControl(Page(items=[]), None, lambda candidate: candidate[1], on_accept=ok_handler)
+    search_box = TextArea(multiline=False, accept_handler=submit_handler)
+    search_box.buffer.on_text_changed += on_text_changed
+
+    dialog = Dialog(
+        title=title,
+        body=HSplit(
+            [Label(text=text, dont_extend_height=True), search_box, Window(content=control, wrap_lines=False)],
+            padding=1,
+        ),
+        buttons=[
+            Button(text=ok_text, handler=ok_handler),
+            Button(text=cancel_text, handler=cancel_handler),
+        ],
+        with_background=True,
+    )
+
+    bindings = KeyBindings()
+    bindings.add('tab')(focus_next)
+    bindings.add('s-tab')(focus_previous)
+
+    @bindings.add('down', filter=has_focus(search_box))
+    def _to_candidates(event) -> None:
+        if control.items:
+            event.app.layout.focus(control)
+
+    return Application(
+        layout=Layout(dialog, focused_element=search_box),
+        key_bindings=merge_key_bindings([load_key_bindings(), bindings]),
+        mouse_support=True,
+        style=style,
+        full_screen=True,
+    )
+
+
+def wait_for(future, title='', text='Please wait...', style=None):
+    """
+    Keep the screen responsive with a message while `future` runs in a worker,
+    then return its result (or raise its exception).
+    """
+    if not future.done():
+        async def close_when_done() -> None:
+            await asyncio.wait([asyncio.wrap_future(future)])
+            application.exit()
+
+        application = Application(
+            layout=Layout(Dialog(title=title, body=Label(text=text), with_background=True)),
+            key_bindings=load_key_bindings(),
+            style=style,
+            full_screen=True,
+        )
+        application.run(pre_run=lambda: application.create_background_task(close_when_done()))
+
+    return future.result()
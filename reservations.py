@@ -0,0 +1,248 @@
+import os
+import random
+import tempfile
+import argparse
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, select, update, func, insert, event, true
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import IntegrityError
+
+from config import baseConfig, userRoles, copyStatuses
+from models import Base, User, Author, Publisher, Book, Copy, Request, adjust_active_loans, add_copies, checkout_copies, checkin_copies, session_scope
+from logger import LOGGER
+import holds
+
+
+LOAN_PERIOD = timedelta(days=14)
+
+
+class ReservationError(Exception):
+    LIMIT_REACHED = 'limit_reached'
+    UNAVAILABLE = 'unavailable'
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def reserve(session, book_id: int, user_id: int, limit: int = None) -> Request:
+    """
+    Reserve a book in a single transaction without table locks.
+
+    The user's active_loans and the book's available_copies counters are claimed with
+    conditional UPDATEs, so the limit and availability checks are primary-key writes that
+    also serialize competing reservations on the same rows; the lowest-numbered available
+    copy is then lent. A user whose hold on the book is ready gets the copy set aside for
+    them instead. The partial unique index on open requests per copy stays as a backstop
+    should the counters ever drift.
+    Raises ReservationError when the reservation is refused.
+    """
+    limit = baseConfig.MAX_RESERVATIONS_LIMIT if limit is None else limit
+    today = date.today()
+
+    try:
+        user_claimed = session.execute(
+            update(User)
+            .where(User.id == user_id, User.active_loans < limit)
+            .values(active_loans=User.active_loans + 1)
+        ).rowcount
+        if not user_claimed:
+            session.rollback()
+            raise ReservationError(ReservationError.LIMIT_REACHED, f"You have already reached the maximum limit of {limit} reservations.")
+
+        copy_id = holds.claim(session, book_id, user_id)
+        if copy_id is not None:
+            # The held copy was already taken off the available ones when the hold was served
+            session.execute(update(Book).where(Book.id == book_id).values(active_loans=Book.active_loans + 1))
+            session.execute(update(Copy).where(Copy.id == copy_id).values(status=copyStatuses.ON_LOAN))
+        else:
+            book_claimed = session.execute(
+                update(Book)
+                .where(Book.id == book_id, Book.available_copies > 0)
+                .values(active_loans=Book.active_loans + 1, available_copies=Book.available_copies - 1)
+            ).rowcount
+            if not book_claimed:
+                session.rollback()
+                raise ReservationError(ReservationError.UNAVAILABLE, "No copy of the selected book is available.")
+            copy_id, = checkout_copies(session, [book_id])
+
+        request_id = session.execute(
+            insert(Request)
+            .values(book_id=book_id, user_id=user_id, copy_id=copy_id, delivery_date=today, return_deadline=today + LOAN_PERIOD)
+            .returning(Request.id)
+        ).scalar()
+        session.commit()
+    except (IntegrityError, ValueError):
+        session.rollback()
+        raise ReservationError(ReservationError.UNAVAILABLE, "No copy of the selected book is available.")
+
+    request = session.get(Request, request_id)
+    LOGGER.info(f"Created request: {request}")
+    return request
+
+
+def release(session, request_id: int) -> bool:
+    """
+    Close an open request and give back its copy and loan counters in the same transaction,
+    in which the copy also goes to the next hold on the book, if any.
+    Returns False when the request was already returned.
+    """
+    request = session.get(Request, request_id)
+    returned = session.execute(
+        update(Request)
+        .where(Request.id == request_id, Request.return_date.is_(None))
+        .values(return_date=date.today())
+    ).rowcount
+    if not returned:
+        session.rollback()
+        return False
+
+    checkin_copies(session, [request.copy_id])
+    adjust_active_loans(session, [(request.book_id, request.user_id)], -1)
+    holds.allocate(session, request.book_id)
+    session.commit()
+    LOGGER.info(f"Returned request: {request}")
+    return True
+
+
+def counter_checks() -> list:
+    """
+    (model, counter, grouping column, conditions) for every maintained counter: the counter
+    must equal the number of rows matching the conditions, grouped by the column.
+    """
+    open_requests = Request.return_date.is_(None)
+    return [
+        (User, User.active_loans, Request.user_id, open_requests),
+        (Book, Book.active_loans, Request.book_id, open_requests),
+        (Book, Book.available_copies, Copy.book_id, Copy.status == copyStatuses.AVAILABLE),
+        (Book, Book.total_copies, Copy.book_id, true()),
+    ]
+
+
+def reconcile(session, fix: bool = False) -> list:
+    """
+    Compare the loan and copy counters of users and books against the requests and copies
+    and return the drifted rows as (counter, id, value, actual) tuples.
+    With `fix`, the counters are rewritten to the actual counts.
+    """
+    drift = []
+    for model, counter, column, condition in counter_checks():
+        counts = (
+            select(column.label('id'), func.count().label('rows'))
+            .where(condition)
+            .group_by(column)
+            .subquery()
+        )
+        actual = func.coalesce(counts.c.rows, 0)
+        rows = session.execute(
+            select(model.id, counter, actual)
+            .outerjoin(counts, counts.c.id == model.id)
+            .where(counter != actual)
+        ).all()
+        name = f"{model.__tablename__}.{counter.key}"
+        for id, value, rows_counted in rows:
+            LOGGER.warning(f"{name} of {id} is {value}, actual count is {rows_counted}")
+            drift.append((name, id, value, rows_counted))
+            if fix:
+                session.execute(update(model).where(model.id == id).values({counter.key: rows_counted}))
+    if fix:
+        session.commit()
+    return drift
+
+
+def stress(workers: int = 300, books: int = 20, users: int = 50, limit: int = 3, copies: int = 2) -> None:
+    """
+    Fire `workers` simultaneous reservations at a throwaway SQLite WAL database and
+    check that no copy is lent twice, no book lends more copies than it holds and no user
+    exceeds the limit.
+    """
+    path = os.path.join(tempfile.mkdtemp(), 'stress.db')
+    engine = create_engine(f'sqlite:///{path}', pool_size=workers, max_overflow=0)
+
+    @event.listens_for(engine, 'connect')
+    def configure(dbapi_connection, connection_record):
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+        dbapi_connection.execute('PRAGMA busy_timeout=30000')
+
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as session:
+        author = Author(first_name='Stress', last_name='Test')
+        publisher = Publisher(publisher_name='Stress', city='Test')
+        session.add_all([author, publisher])
+        session.add_all(Book(book_name=f'Book {i}', isbn='9780747532699', author=author, publisher=publisher) for i in range(books))
+        session.add_all(User(id=i, email=f'{i}@stress.test', first_name='Stress', last_name='Test', password='-', role=userRoles.STUDENT) for i in range(1, users + 1))
+        session.flush()
+        add_copies(session, {book_id: copies for book_id in range(1, books + 1)})
+        session.commit()
+
+    barrier = threading.Barrier(workers)
+    outcomes = {'reserved': 0, ReservationError.LIMIT_REACHED: 0, ReservationError.UNAVAILABLE: 0, 'error': 0}
+    outcomes_lock = threading.Lock()
+
+    def worker() -> None:
+        book_id, user_id = random.randint(1, books), random.randint(1, users)
+        with Session() as session:
+            barrier.wait()
+            try:
+                reserve(session, book_id, user_id, limit)
+                outcome = 'reserved'
+            except ReservationError as e:
+                outcome = e.reason
+            except Exception as e:
+                LOGGER.error(f"Stress reservation failed: {e}")
+                outcome = 'error'
+        with outcomes_lock:
+            outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with Session() as session:
+        open_requests = select(Request).where(Request.return_date.is_(None)).subquery()
+        copies_lent_twice = session.execute(select(open_requests.c.copy_id).group_by(open_requests.c.copy_id).having(func.count() > 1)).all()
+        books_overlent = session.execute(
+            select(open_requests.c.book_id)
+            .join(Book, Book.id == open_requests.c.book_id)
+            .group_by(open_requests.c.book_id, Book.total_copies)
+            .having(func.count() > Book.total_copies)
+        ).all()
+        users_over_limit = session.execute(select(open_requests.c.user_id).group_by(open_requests.c.user_id).having(func.count() > limit)).all()
+        drift = reconcile(session)
+
+    print(f"outcomes:          {outcomes}")
+    print(f"copies lent twice: {len(copies_lent_twice)}")
+    print(f"books overlent:    {len(books_overlent)}")
+    print(f"users over limit:  {len(users_over_limit)}")
+    print(f"counter drift:     {len(drift)}")
+    engine.dispose()
+    if copies_lent_twice or books_overlent or users_over_limit or drift or outcomes['error']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reservation engine maintenance.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    stress_parser = commands.add_parser('stress', help='Run a concurrency stress test on a temporary SQLite WAL database.')
+    stress_parser.add_argument('--workers', type=int, default=300)
+    stress_parser.add_argument('--books', type=int, default=20)
+    stress_parser.add_argument('--users', type=int, default=50)
+    stress_parser.add_argument('--limit', type=int, default=3)
+    stress_parser.add_argument('--copies', type=int, default=2, help='Copies held of every book.')
+    reconcile_parser = commands.add_parser('reconcile', help='Check the loan and copy counters against the requests and copies.')
+    reconcile_parser.add_argument('--fix', action='store_true', help='Rewrite drifted counters to the actual counts.')
+    args = parser.parse_args()
+
+    if args.command == 'stress':
+        stress(args.workers, args.books, args.users, args.limit, args.copies)
+    else:
+        with session_scope() as session:
+            drift = reconcile(session, args.fix)
+        print(f"{len(drift)} drifted counters{' fixed' if args.fix and drift else ''}")
+        if drift and not args.fix:
+            raise SystemExit(1)
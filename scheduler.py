@@ -0,0 +1,294 @@
+import json
+import os
+import heapq
+import time
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, update, insert, func, tuple_
+
+from config import baseConfig, databaseConfig, notificationKinds
+from models import Book, Request, Notification, UPSERT_INSERTS
+from logger import LOGGER
+import holds
+
+
+REMINDER_LEAD = timedelta(days=baseConfig.REMINDER_DAYS_BEFORE)
+
+
+def reminder_times(deadline: date) -> list:
+    """
+    (when, kind) of the reminders of a loan due back on `deadline`: one ahead of the
+    deadline and one on the first day the loan is overdue.
+    """
+    return [
+        (datetime.combine(deadline - REMINDER_LEAD, datetime.min.time()), notificationKinds.DUE_SOON),
+        (datetime.combine(deadline + timedelta(days=1), datetime.min.time()), notificationKinds.OVERDUE),
+    ]
+
+
+def reminder_message(kind: str, book_name: str, deadline: date) -> str:
+    if kind == notificationKinds.DUE_SOON:
+        return f"'{book_name}' is due back on {deadline}."
+    return f"'{book_name}' was due back on {deadline} and is now overdue."
+
+
+class Scheduler:
+    """
+    Worker thread that writes due-date reminders to the notification outbox and expires holds.
+
+    Upcoming reminders sit in a min-heap of (when, kind, request id). Open loans are read into it
+    in deadline order, `batch_size` at a time, through the open-deadline index, and only once the
+    heap no longer reaches past the loans read so far. The thread sleeps until the earliest reminder
+    or hold expiry is due. Every `refresh_seconds` it also seeks the loans created since it started,
+    by primary key, and reloads the ready holds; the requests table is never scanned as a whole.
+    """
+
+    def __init__(self, session_factory=None, batch_size: int = None, refresh_seconds: int = None):
+        self.Session = session_factory or databaseConfig.Session
+        self.batch_size = batch_size or baseConfig.SCHEDULER_BATCH_SIZE
+        self.refresh_seconds = baseConfig.SCHEDULER_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self.heap = []
+        # (return_deadline, id) of the last open loan read in deadline order
+        self.cursor = (date.min, 0)
+        self.exhausted = False
+        self.last_request_id = None
+        self.next_refresh = None
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def schedule(self, request_id: int, deadline: date) -> None:
+        for when, kind in reminder_times(deadline):
+            heapq.heappush(self.heap, (when, kind, request_id))
+
+    def frontier(self) -> datetime:
+        """
+        Earliest reminder any loan not read yet can have.
+        """
+        return reminder_times(self.cursor[0])[0][0] if self.cursor[0] > date.min else datetime.min
+
+    def load(self, session) -> int:
+        """
+        Read the next batches of open loans until the heap covers everything due before the
+        loans still unread. Returns the number of loans read.
+        """
+        loaded = 0
+        while not self.exhausted and (not self.heap or self.heap[0][0] >= self.frontier()):
+            rows = session.execute(
+                select(Request.id, Request.return_deadline)
+                .where(Request.return_date.is_(None), tuple_(Request.return_deadline, Request.id) > tuple_(*self.cursor))
+                .order_by(Request.return_deadline, Request.id)
+                .limit(self.batch_size)
+            ).all()
+            for request_id, deadline in rows:
+                self.schedule(request_id, deadline)
+            if rows:
+                self.cursor = (rows[-1].return_deadline, rows[-1].id)
+            self.exhausted = len(rows) < self.batch_size
+            loaded += len(rows)
+        return loaded
+
+    def refresh(self, session, now: datetime) -> None:
+        """
+        Pick up the loans created since the last refresh and the holds made ready by other processes.
+        """
+        if self.last_request_id is None:
+            self.last_request_id = session.execute(select(func.max(Request.id))).scalar() or 0
+        else:
+            rows = session.execute(
+                select(Request.id, Request.return_deadline)
+                .where(Request.id > self.last_request_id, Request.return_date.is_(None))
+                .order_by(Request.id)
+            ).all()
+            for request_id, deadline in rows:
+                # Loans past the cursor are read in deadline order later on
+                if (deadline, request_id) <= self.cursor:
+                    self.schedule(request_id, deadline)
+            self.last_request_id = max([self.last_request_id] + [row.id for row in rows])
+        # Loans beyond the last batch may have been created in the meantime
+        self.exhausted = False
+        holds.EXPIRY.load(session)
+        self.next_refresh = now + timedelta(seconds=self.refresh_seconds)
+
+    def pop_due(self, now: datetime) -> list:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        return due
+
+    def send(self, session, due: list, now: datetime) -> int:
+        """
+        Write the reminders of the due entries whose loans are still open to the outbox in one
+        batch and commit. Reminders already in the outbox are skipped. Returns the number written.
+        """
+        if not due:
+            return 0
+        loans = {
+            row.id: row for row in session.execute(
+                select(Request.id, Request.user_id, Request.return_deadline, Book.book_name)
+                .join(Book, Book.id == Request.book_id)
+                .where(Request.id.in_({request_id for _, _, request_id in due}), Request.return_date.is_(None))
+            )
+        }
+        notifications = []
+        for _, kind, request_id in due:
+            loan = loans.get(request_id)
+            if loan is None:
+                continue
+            # A loan read after its deadline only gets the overdue notice
+            if kind == notificationKinds.DUE_SOON and now.date() > loan.return_deadline:
+                continue
+            notifications.append({
+                'user_id': loan.user_id,
+                'kind': kind,
+                'reference_id': request_id,
+                'message': reminder_message(kind, loan.book_name, loan.return_deadline),
+                'created_at': now,
+            })
+        if not notifications:
+            return 0
+
+        upsert_insert = UPSERT_INSERTS.get(session.get_bind().dialect.name)
+        if upsert_insert is not None:
+            written = session.execute(
+                upsert_insert(Notification.__table__).on_conflict_do_nothing(index_elements=['kind', 'reference_id']),
+                notifications,
+            ).rowcount
+        else:
+            sent = set(session.execute(
+                select(Notification.kind, Notification.reference_id)
+                .where(Notification.reference_id.in_({notification['reference_id'] for notification in notifications}))
+            ).all())
+            notifications = [notification for notification in notifications if (notification['kind'], notification['reference_id']) not in sent]
+            if notifications:
+                session.execute(insert(Notification.__table__), notifications)
+            written = len(notifications)
+        session.commit()
+        return written
+
+    def step(self, now: datetime = None) -> tuple:
+        """
+        Do whatever is due by `now` and return the number of reminders written and holds expired.
+        """
+        now = now or datetime.now()
+        with self.Session() as session:
+            if self.next_refresh is None or now >= self.next_refresh:
+                self.refresh(session, now)
+            sent = 0
+            # Batch after batch, until the loans still unread have nothing due by `now`
+            while True:
+                self.load(session)
+                due = self.pop_due(now)
+                if not due:
+                    break
+                try:
+                    sent += self.send(session, due, now)
+                except Exception:
+                    # The cursor is already past these loans, so only the heap can bring them back
+                    for entry in due:
+                        heapq.heappush(self.heap, entry)
+                    raise
+            next_expiry = holds.EXPIRY.next_expiry()
+            expired = holds.expire(session, now) if next_expiry is not None and next_expiry <= now else 0
+        if sent or expired:
+            LOGGER.info(f"Scheduler wrote {sent} reminders and expired {expired} holds")
+        return sent, expired
+
+    def seconds_until_due(self, now: datetime) -> float:
+        wake_at = [when for when in (self.next_refresh, self.heap[0][0] if self.heap else None, holds.EXPIRY.next_expiry()) if when is not None]
+        if not wake_at:
+            return self.refresh_seconds
+        return max((min(wake_at) - now).total_seconds(), 0)
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                self.step()
+                timeout = self.seconds_until_due(datetime.now())
+            except Exception as e:
+                LOGGER.error(f"Scheduler step failed: {e}")
+                timeout = self.refresh_seconds
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+    def wake(self) -> None:
+        """
+        Run a step now instead of at the next due time, e.g. after loans were changed in this process.
+        """
+        self.wakeup.set()
+
+    def start(self) -> 'Scheduler':
+        self.thread = threading.Thread(target=self.run, name='scheduler', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def drain(session, output: str, batch_size: int = None) -> int:
+    """
+    Append the undelivered notifications to `output` as JSON lines, oldest first, and mark
+    them delivered batch by batch. A batch is synced to disk before it is marked, so a crash
+    can repeat notifications but never lose them. Returns the number delivered.
+    """
+    batch_size = batch_size or baseConfig.SCHEDULER_BATCH_SIZE
+    delivered = 0
+    with open(output, 'a') as file:
+        while True:
+            notifications = session.scalars(
+                select(Notification)
+                .where(Notification.delivered_at.is_(None))
+                .order_by(Notification.id)
+                .limit(batch_size)
+            ).all()
+            if not notifications:
+                return delivered
+            for notification in notifications:
+                file.write(json.dumps({
+                    'id': notification.id,
+                    'user_id': notification.user_id,
+                    'kind': notification.kind,
+                    'reference_id': notification.reference_id,
+                    'message': notification.message,
+                    'created_at': notification.created_at.isoformat(),
+                }) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+            session.execute(
+                update(Notification)
+                .where(Notification.id.in_([notification.id for notification in notifications]))
+                .values(delivered_at=datetime.now())
+            )
+            session.commit()
+            delivered += len(notifications)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Due-date reminders and hold expiry.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('run', help='Run the scheduler until interrupted.')
+    commands.add_parser('once', help='Do whatever is due now and exit, e.g. from cron.')
+    drain_parser = commands.add_parser('drain', help='Append the undelivered notifications to a JSON Lines file.')
+    drain_parser.add_argument('output', help='Path of the file to append to.')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        scheduler = Scheduler().start()
+        try:
+            while scheduler.thread.is_alive():
+                scheduler.thread.join(1)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    elif args.command == 'once':
+        started = time.perf_counter()
+        sent, expired = Scheduler().step()
+        print(f"Wrote {sent} reminders and expired {expired} holds in {time.perf_counter() - started:.2f}s")
+    else:
+        with databaseConfig.Session() as session:
+            delivered = drain(session, args.output)
+        print(f"Delivered {delivered} notifications to {args.output}")
@@ -0,0 +1,88 @@
+from sqlalchemy import select, union_all, func, literal, Float
+from sqlalchemy.orm import joinedload
+
+from models import Book, Author, Publisher
+from utils import check_isbn
+from pagination import paginate, Page, DEFAULT_PAGE_SIZE
+from . import fulltext, trigram
+
+
+# Relevance of each kind of match; a higher score sorts first
+ISBN_SCORE = 1000.0
+TITLE_SCORE = 3.0
+AUTHOR_SCORE = 2.0
+PUBLISHER_SCORE = 1.0
+
+
+def _candidates(session, search_input: str) -> list:
+    """
+    Build one (book_id, score) select per way a book can match the input.
+    """
+    branches = []
+
+    is_valid_isbn, isbn = check_isbn(search_input)
+    if is_valid_isbn:
+        branches.append(select(Book.id.label('book_id'), literal(ISBN_SCORE, Float).label('score')).where(Book.isbn == isbn))
+
+    matches = fulltext.ranked_matches(session.get_bind(), search_input)
+    if matches is not None:
+        # The full-text rank already weighs title, author and publisher hits
+        branches.append(select(matches.c.book_id, (-matches.c.rank).label('score')))
+    else:
+        pattern = f'%{search_input}%'
+        branches.append(
+            select(Book.id.label('book_id'), literal(TITLE_SCORE, Float).label('score'))
+            .where(Book.book_name.ilike(pattern))
+        )
+        branches.append(
+            select(Book.id.label('book_id'), literal(AUTHOR_SCORE, Float).label('score'))
+            .join(Author, Author.id == Book.author_id)
+            .where((Author.first_name + ' ' + Author.last_name).ilike(pattern))
+        )
+        branches.append(
+            select(Book.id.label('book_id'), literal(PUBLISHER_SCORE, Float).label('score'))
+            .join(Publisher, Publisher.id == Book.publisher_id)
+            .where(Publisher.publisher_name.ilike(pattern))
+        )
+
+    return branches
+
+
+def search(session, search_input: str, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """
+    Return a page of books matching the input by ISBN, title, author or publisher,
+    deduplicated and best match first, with author and publisher loaded.
+    Costs a single round trip however many authors or publishers match.
+    """
+    branches = _candidates(session, search_input)
+    candidates = union_all(*branches).subquery('candidates') if len(branches) > 1 else branches[0].subquery('candidates')
+    scored = (
+        select(candidates.c.book_id, func.max(candidates.c.score).label('score'))
+        .group_by(candidates.c.book_id)
+        .subquery('scored')
+    )
+    query = (
+        session.query(Book)
+        .join(scored, Book.id == scored.c.book_id)
+        .options(joinedload(Book.author), joinedload(Book.publisher))
+    )
+    return paginate(query, [scored.c.score.desc(), Book.id], cursor, page_size)
+
+
+def fuzzy_search(session, search_input: str) -> list:
+    """
+    Return books whose title or author is close to the input, using the in-memory trigram indexes.
+    """
+    book_ids = trigram.search(session, 'books', search_input)
+    author_ids = trigram.search(session, 'authors', search_input)
+    if not book_ids and not author_ids:
+        return []
+
+    books = (
+        session.query(Book)
+        .filter(Book.id.in_(book_ids) | Book.author_id.in_(author_ids))
+        .options(joinedload(Book.author), joinedload(Book.publisher))
+        .all()
+    )
+    books.sort(key=lambda book: book_ids.index(book.id) if book.id in book_ids else len(book_ids) + author_ids.index(book.author_id))
+    return books
@@ -0,0 +1,175 @@
+import re
+from sqlalchemy import text, bindparam, Integer, Float
+
+from logger import LOGGER
+
+
+# Column weights used for ranking: title, author, publisher, isbn
+SQLITE_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    "book_name, author_name, publisher_name, isbn, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+]
+
+POSTGRESQL_DDL = [
+    "CREATE TABLE IF NOT EXISTS books_search ("
+    "book_id INTEGER PRIMARY KEY REFERENCES books (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_books_search_document ON books_search USING GIN (document)",
+]
+
+SOURCE_QUERY = (
+    "SELECT books.id, books.book_name, authors.first_name || ' ' || authors.last_name, "
+    "publishers.publisher_name, books.isbn "
+    "FROM books "
+    "JOIN authors ON authors.id = books.author_id "
+    "JOIN publishers ON publishers.id = books.publisher_id"
+)
+
+# Which books have to be re-indexed when a row of the given table changes
+SOURCE_FILTERS = {
+    'books': 'books.id = :id',
+    'authors': 'books.author_id = :id',
+    'publishers': 'books.publisher_id = :id',
+}
+
+
+def dialect_name(bind) -> str:
+    return bind.dialect.name
+
+
+def is_supported(bind) -> bool:
+    return dialect_name(bind) in ('sqlite', 'postgresql')
+
+
+def create_index(connection) -> None:
+    """
+    Create the full-text search structures for the connection's backend.
+    SQLite gets an FTS5 virtual table, PostgreSQL gets a tsvector table with a GIN index.
+    """
+    ddl = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRESQL_DDL}.get(dialect_name(connection))
+    if ddl is None:
+        LOGGER.warning(f"Full-text search is not supported on {dialect_name(connection)}")
+        return
+    for statement in ddl:
+        connection.execute(text(statement))
+
+
+def drop_index(connection) -> None:
+    """
+    Drop the full-text search structures created by create_index.
+    """
+    if dialect_name(connection) == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS books_fts"))
+    elif dialect_name(connection) == 'postgresql':
+        connection.execute(text("DROP TABLE IF EXISTS books_search"))
+
+
+def _insert_statement(bind, where: str):
+    if dialect_name(bind) == 'sqlite':
+        return text(
+            "INSERT INTO books_fts (rowid, book_name, author_name, publisher_name, isbn) "
+            f"{SOURCE_QUERY} WHERE {where}"
+        )
+    return text(
+        "INSERT INTO books_search (book_id, document) "
+        "SELECT source.id, "
+        "setweight(to_tsvector('simple', coalesce(source.book_name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(source.author_name, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(source.publisher_name, '')), 'C') || "
+        "setweight(to_tsvector('simple', coalesce(source.isbn, '')), 'D') "
+        f"FROM ({SOURCE_QUERY} WHERE {where}) "
+        "AS source (id, book_name, author_name, publisher_name, isbn)"
+    )
+
+
+def _delete_statement(bind, where: str):
+    if dialect_name(bind) == 'sqlite':
+        return text(f"DELETE FROM books_fts WHERE rowid IN (SELECT books.id FROM books WHERE {where})")
+    return text(f"DELETE FROM books_search WHERE book_id IN (SELECT books.id FROM books WHERE {where})")
+
+
+def sync(session, entity) -> None:
+    """
+    Re-index every book affected by a created or updated entity.
+    Must be called inside the writing session so the index commits with the row.
+    """
+    where = SOURCE_FILTERS.get(getattr(entity, '__tablename__', None))
+    bind = session.get_bind()
+    if where is None or entity.id is None or not is_supported(bind):
+        return
+    session.execute(_delete_statement(bind, where), {'id': entity.id})
+    session.execute(_insert_statement(bind, where), {'id': entity.id})
+
+
+def sync_books(session, book_ids: list) -> None:
+    """
+    Index a batch of books in two statements, for bulk inserts.
+    """
+    bind = session.get_bind()
+    if not book_ids or not is_supported(bind):
+        return
+    where = 'books.id IN :ids'
+    parameters = {'ids': list(book_ids)}
+    session.execute(_delete_statement(bind, where).bindparams(bindparam('ids', expanding=True)), parameters)
+    session.execute(_insert_statement(bind, where).bindparams(bindparam('ids', expanding=True)), parameters)
+
+
+def discard(session, entity) -> None:
+    """
+    Remove a deleted book from the index.
+    """
+    bind = session.get_bind()
+    if getattr(entity, '__tablename__', None) != 'books' or not is_supported(bind):
+        return
+    if dialect_name(bind) == 'sqlite':
+        session.execute(text("DELETE FROM books_fts WHERE rowid = :id"), {'id': entity.id})
+    else:
+        session.execute(text("DELETE FROM books_search WHERE book_id = :id"), {'id': entity.id})
+
+
+def rebuild(session) -> None:
+    """
+    Drop and re-populate the whole index from the catalog tables.
+    """
+    bind = session.get_bind()
+    if not is_supported(bind):
+        return
+    if dialect_name(bind) == 'sqlite':
+        session.execute(text("DELETE FROM books_fts"))
+    else:
+        session.execute(text("DELETE FROM books_search"))
+    session.execute(_insert_statement(bind, '1 = 1'))
+    LOGGER.info("Rebuilt full-text search index")
+
+
+def tokenize(search_input: str) -> list:
+    return re.findall(r'\w+', search_input.lower())
+
+
+def ranked_matches(bind, search_input: str):
+    """
+    Return a subquery of every (book_id, rank) match, where a lower rank is a better match,
+    or None if the backend has no full-text support or the input has no searchable terms.
+    Every term is matched as a prefix, so partially typed words still hit. The subquery is not
+    limited; the caller's page cursor decides how many matches are read.
+    """
+    terms = tokenize(search_input)
+    if not terms or not is_supported(bind):
+        return None
+
+    if dialect_name(bind) == 'sqlite':
+        # The ORDER BY keeps SQLite from flattening the subquery into the caller's, where bm25() cannot run
+        statement = text(
+            f"SELECT rowid AS book_id, bm25(books_fts, {', '.join(map(str, SQLITE_WEIGHTS))}) AS rank "
+            "FROM books_fts WHERE books_fts MATCH :query ORDER BY rank"
+        ).bindparams(query=' '.join(f'"{term}"*' for term in terms))
+    else:
+        statement = text(
+            "SELECT book_id, -ts_rank(document, to_tsquery('simple', :query)) AS rank "
+            "FROM books_search WHERE document @@ to_tsquery('simple', :query)"
+        ).bindparams(query=' & '.join(f'{term}:*' for term in terms))
+
+    return statement.columns(book_id=Integer, rank=Float).subquery('fulltext_matches')
@@ -0,0 +1,20 @@
+from . import trigram, prefix
+
+
+# In-memory indexes that mirror the catalog tables
+INDEXES = (trigram, prefix)
+
+
+def build(session) -> None:
+    for index in INDEXES:
+        index.build(session)
+
+
+def sync(entity) -> None:
+    for index in INDEXES:
+        index.sync(entity)
+
+
+def discard(entity) -> None:
+    for index in INDEXES:
+        index.discard(entity)
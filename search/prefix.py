@@ -0,0 +1,138 @@
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import text
+
+from config import databaseConfig
+from logger import LOGGER
+from .trigram import SOURCE_QUERIES, normalize, document_text
+
+
+class PrefixIndex:
+    """
+    Sorted word list for prefix lookups; every word of a document is one entry.
+    Words and ids live in two parallel sorted sequences (interned strings and a
+    32-bit id array) so a 500k-title catalog stays compact and a lookup is a bisect.
+    """
+
+    def __init__(self, scan_limit: int = 2000):
+        self.scan_limit = scan_limit
+        self.words = []
+        self.ids = array('I')
+        self.documents = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def load(self, rows) -> None:
+        """
+        Bulk-load (id, value) pairs, sorting once instead of inserting one by one.
+        """
+        entries = []
+        for id, value in rows:
+            document = normalize(value)
+            self.documents[id] = (document, value)
+            entries.extend((sys.intern(word), id) for word in set(document.split()))
+        entries.extend(zip(self.words, self.ids))
+        entries.sort()
+        self.words = [word for word, _ in entries]
+        self.ids = array('I', (id for _, id in entries))
+
+    def add(self, id: int, value: str) -> None:
+        self.remove(id)
+        document = normalize(value)
+        self.documents[id] = (document, value)
+        for word in set(document.split()):
+            word = sys.intern(word)
+            lo, hi = bisect_left(self.words, word), bisect_right(self.words, word)
+            position = lo + bisect_left(self.ids[lo:hi], id)
+            self.words.insert(position, word)
+            self.ids.insert(position, id)
+
+    def remove(self, id: int) -> None:
+        entry = self.documents.pop(id, None)
+        if entry is None:
+            return
+        for word in set(entry[0].split()):
+            lo, hi = bisect_left(self.words, word), bisect_right(self.words, word)
+            position = self.ids.index(id, lo, hi)
+            del self.words[position]
+            del self.ids[position]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        Return up to `limit` (id, value) pairs in which every query word is the prefix of
+        some word; documents that start with the query and shorter documents rank first.
+        """
+        terms = normalize(query).split()
+        if not terms:
+            return []
+
+        # The longest term is usually the most selective one
+        anchor = max(terms, key=len)
+        candidates = {}
+        position = bisect_left(self.words, anchor)
+        end = min(len(self.words), position + self.scan_limit)
+        while position < end and self.words[position].startswith(anchor):
+            id = self.ids[position]
+            document, value = self.documents[id]
+            if id not in candidates and all(any(word.startswith(term) for word in document.split()) for term in terms):
+                candidates[id] = (document, value)
+            position += 1
+
+        phrase = ' '.join(terms)
+        ranked = sorted(candidates.items(), key=lambda item: (not item[1][0].startswith(phrase), len(item[1][0]), item[0]))
+        return [(id, value) for id, (_, value) in ranked[:limit]]
+
+
+INDEXES = {table: PrefixIndex() for table in SOURCE_QUERIES}
+_built = False
+
+
+def build(session) -> None:
+    """
+    Load every searchable table into its prefix index; called once at startup.
+    """
+    global _built
+    started = time.perf_counter()
+    for table, query in SOURCE_QUERIES.items():
+        index = INDEXES[table] = PrefixIndex()
+        index.load(session.execute(text(query)).yield_per(10000))
+    _built = True
+    LOGGER.info(f"Built prefix indexes in {time.perf_counter() - started:.2f}s: " + ', '.join(f'{table}={len(index)}' for table, index in INDEXES.items()))
+
+
+def ensure_built(session) -> None:
+    if not _built:
+        build(session)
+
+
+def sync(entity) -> None:
+    document = document_text(entity)
+    if _built and document is not None:
+        INDEXES[entity.__tablename__].add(entity.id, document)
+
+
+def discard(entity) -> None:
+    table = getattr(entity, '__tablename__', None)
+    if _built and table in INDEXES:
+        INDEXES[table].remove(entity.id)
+
+
+def search(session, table: str, query: str, limit: int = 20) -> list:
+    """
+    Return up to `limit` (id, text) prefix matches from `table` without touching the database
+    once the index is built.
+    """
+    ensure_built(session)
+    return INDEXES[table].search(query, limit)
+
+
+def suggest(table: str, query: str, limit: int = 20) -> list:
+    """
+    Session-managing wrapper around `search` for use from UI worker threads.
+    """
+    with databaseConfig.Session() as session:
+        return search(session, table, query, limit)
@@ -0,0 +1,207 @@
+import re
+import time
+import random
+import string
+from array import array
+from collections import Counter
+
+from sqlalchemy import text
+
+from logger import LOGGER
+
+
+# Text indexed for every searchable table
+SOURCE_QUERIES = {
+    'books': "SELECT id, book_name FROM books",
+    'authors': "SELECT id, first_name || ' ' || last_name FROM authors",
+    'publishers': "SELECT id, publisher_name FROM publishers",
+}
+
+
+def normalize(value: str) -> str:
+    return ' '.join(re.findall(r'\w+', (value or '').lower()))
+
+
+def trigrams(value: str) -> set:
+    """
+    Split a normalized string into trigrams the same way pg_trgm does:
+    every word is padded with two leading spaces and one trailing space.
+    """
+    grams = set()
+    for word in value.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(query_grams: set, document_grams: set) -> float:
+    if not query_grams or not document_grams:
+        return 0.0
+    shared = len(query_grams & document_grams)
+    return shared / (len(query_grams) + len(document_grams) - shared)
+
+
+class TrigramIndex:
+    """
+    In-memory trigram inverted index mapping ids to their normalized text.
+    Posting lists are append-only arrays of 32-bit ids, so an update or delete only
+    touches the document map; stale postings are skipped at query time and dropped
+    by `compact` once they outnumber the live documents.
+    """
+
+    def __init__(self, scan_budget: int = 20000):
+        self.scan_budget = scan_budget
+        self.documents = {}
+        self.postings = {}
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, id: int, value: str) -> None:
+        document = normalize(value)
+        if id in self.documents:
+            if self.documents[id] == document:
+                return
+            self.stale += 1
+        self.documents[id] = document
+        for gram in trigrams(document):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(id)
+        if self.stale > len(self.documents):
+            self.compact()
+
+    def remove(self, id: int) -> None:
+        if self.documents.pop(id, None) is not None:
+            self.stale += 1
+
+    def compact(self) -> None:
+        documents = self.documents
+        self.documents, self.postings, self.stale = {}, {}, 0
+        for id, document in documents.items():
+            self.add(id, document)
+
+    def search(self, query: str, limit: int = 20, threshold: float = 0.3) -> list:
+        """
+        Return up to `limit` (id, score) pairs whose trigram similarity to the query
+        is at least `threshold`, best match first.
+        """
+        query_grams = trigrams(normalize(query))
+        posting_lists = [self.postings[gram] for gram in query_grams if gram in self.postings]
+        if not posting_lists:
+            return []
+
+        # Count hits from the rarest trigrams first and stop once the scan budget is spent;
+        # a close match shares most of its trigrams, so it is still found among the rare ones
+        posting_lists.sort(key=len)
+        hits = Counter()
+        scanned = 0
+        for posting in posting_lists:
+            if scanned and scanned + len(posting) > self.scan_budget:
+                break
+            hits.update(posting)
+            scanned += len(posting)
+
+        results = []
+        for id, _ in hits.most_common(limit * 5):
+            document = self.documents.get(id)
+            if document is None:
+                continue
+            score = similarity(query_grams, trigrams(document))
+            if score >= threshold:
+                results.append((id, score))
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results[:limit]
+
+    def memory_usage(self) -> int:
+        """
+        Approximate number of bytes held by posting lists and documents.
+        """
+        postings = sum(posting.buffer_info()[1] * posting.itemsize for posting in self.postings.values())
+        documents = sum(len(document) for document in self.documents.values())
+        return postings + documents
+
+
+INDEXES = {table: TrigramIndex() for table in SOURCE_QUERIES}
+_built = False
+
+
+def build(session) -> None:
+    """
+    Load every searchable table into its index; called once at startup.
+    """
+    global _built
+    started = time.perf_counter()
+    for table, query in SOURCE_QUERIES.items():
+        index = INDEXES[table] = TrigramIndex()
+        for id, value in session.execute(text(query)).yield_per(10000):
+            index.add(id, value)
+    _built = True
+    LOGGER.info(f"Built trigram indexes in {time.perf_counter() - started:.2f}s: " + ', '.join(f'{table}={len(index)}' for table, index in INDEXES.items()))
+
+
+def ensure_built(session) -> None:
+    if not _built:
+        build(session)
+
+
+def document_text(entity) -> str:
+    table = getattr(entity, '__tablename__', None)
+    if table == 'books':
+        return entity.book_name
+    if table == 'authors':
+        return f'{entity.first_name} {entity.last_name}'
+    if table == 'publishers':
+        return entity.publisher_name
+    return None
+
+
+def sync(entity) -> None:
+    """
+    Re-index a created or updated entity.
+    """
+    document = document_text(entity)
+    if _built and document is not None:
+        INDEXES[entity.__tablename__].add(entity.id, document)
+
+
+def discard(entity) -> None:
+    table = getattr(entity, '__tablename__', None)
+    if _built and table in INDEXES:
+        INDEXES[table].remove(entity.id)
+
+
+def search(session, table: str, query: str, limit: int = 20) -> list:
+    """
+    Return the ids of the closest fuzzy matches in `table`, best match first.
+    """
+    ensure_built(session)
+    return [id for id, _ in INDEXES[table].search(query, limit)]
+
+
+def benchmark(count: int = 500000) -> None:
+    words = [''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 9))) for _ in range(20000)]
+    titles = [' '.join(random.choices(words, k=random.randint(2, 6))) for _ in range(count)]
+
+    index = TrigramIndex()
+    started = time.perf_counter()
+    for id, title in enumerate(titles, start=1):
+        index.add(id, title)
+    build_time = time.perf_counter() - started
+
+    queries = [title[:-2] + 'zq' for title in random.sample(titles, 100)]
+    started = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    query_time = (time.perf_counter() - started) / len(queries)
+
+    print(f"titles:      {count}")
+    print(f"build time:  {build_time:.2f}s")
+    print(f"query time:  {query_time * 1000:.1f}ms")
+    print(f"memory:      {index.memory_usage() / 2 ** 20:.1f}MiB")
+
+
+if __name__ == '__main__':
+    benchmark()
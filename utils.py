@@ -1,14 +1,48 @@
 import re
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 
+from config import baseConfig
 
-def hash_password(password):
-    salt = bcrypt.gensalt()
+
+# bcrypt releases the GIL, so a small thread pool hashes in parallel without blocking the UI thread
+PASSWORD_EXECUTOR = ThreadPoolExecutor(max_workers=baseConfig.PASSWORD_WORKERS, thread_name_prefix='password')
+
+
+def _as_bytes(hashed_password):
+    return hashed_password.encode('utf-8') if isinstance(hashed_password, str) else hashed_password
+
+
+def hash_password(password, rounds: int = None):
+    salt = bcrypt.gensalt(rounds=rounds or baseConfig.BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode('utf-8'), salt)
 
 
 def check_password(password, hashed_password):
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    return bcrypt.checkpw(password.encode('utf-8'), _as_bytes(hashed_password))
+
+
+def password_rounds(hashed_password) -> int:
+    # bcrypt hashes look like $2b$<rounds>$<salt and hash>
+    return int(_as_bytes(hashed_password).split(b'$')[2])
+
+
+def password_needs_rehash(hashed_password) -> bool:
+    return password_rounds(hashed_password) != baseConfig.BCRYPT_ROUNDS
+
+
+def submit_hash_password(password):
+    """
+    Hash on the password worker pool; returns a concurrent.futures.Future.
+    """
+    return PASSWORD_EXECUTOR.submit(hash_password, password)
+
+
+def submit_check_password(password, hashed_password):
+    """
+    Verify on the password worker pool; returns a concurrent.futures.Future.
+    """
+    return PASSWORD_EXECUTOR.submit(check_password, password, hashed_password)
 
 
 def check_isbn(isbn: str):